@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
+import asyncio
+import hashlib
+import json
 import multiprocessing as mp
+import os
+from pathlib import Path
+import re
+import signal
+import socket
+import tempfile
+import threading
 import time
 import unittest
+import zlib
 from unittest import TestSuite, TestCase
+from queue import Queue
 
 import tap
 
 MANIFEST = {
     "name":"test",
-    "codebase": {},
+    "codebase": { "example":"manifest.json.example" },
 
     "functions": {
         "test_no_action": {
@@ -35,22 +47,64 @@ MANIFEST = {
             "parameters": {"p1":1, "p2":"2", "p3":3.3},
             "commands": ["echo $p1", "echo $p2", "echo $p3"],
             "outputs": { "output3":{"cmd":"echo $output_2","format":".*"} }
+        },
+        ##
+        "test_sleep": {
+            "description":"test_sleep",
+            "parameters": {"t":0.1},
+            "commands": ["echo begin; sleep $t; echo end"],
+            "outputs": { "output":{"cmd":"echo $output_0","format":"end"} }
+        },
+        ##
+        "test_serial": {
+            "description":"test_serial",
+            "concurrency": 1,
+            "commands": ["sleep 0.2"]
+        },
+        ##
+        "test_argv": {
+            "description":"test_argv",
+            "parameters": {"msg":"a b; echo c"},
+            "commands": [["echo", "$msg"]],
+            "outputs": { "output":{"source":0,"format":".+"} }
+        },
+        ##
+        "test_match": {
+            "description":"test_match",
+            "commands": ["echo rate 1.5 x 3; echo rate 2.5 x 4; echo err 7 >&2"],
+            "outputs": {
+                "rate":{"source":0,"format":"rate (\\d+\\.\\d+)","type":"float"},
+                "named":{"source":0,"format":"rate (?P<r>\\S+) x (?P<n>\\d+)","type":"float"},
+                "code":{"source":0,"stream":"stderr","format":"err (\\d+)","type":"int"}
+            }
         }
     }
 }
 
 class TapTestCase(TestCase):
+    server_args = {} #the extra arguments of the server
+
     @classmethod
     def setUpClass(cls):
-        cls.server = tap.MasterDaemon(tap.SERVER_PORT, tap.IPC_PORT, MANIFEST)
+        cls.server = tap.MasterDaemon(tap.SERVER_PORT, tap.IPC_PORT, MANIFEST, **cls.server_args)
         cls.client = tap.SlaveDaemon(tap.SERVER_PORT, MANIFEST, '127.0.0.1')
         ##
         cls.proc_server = mp.Process(target=cls.server.start)
         cls.proc_client = mp.Process(target=cls.client.start)
         cls.proc_server.start()
-        time.sleep(0.01)
+        cls._poll(lambda clients: True) #the client connects only once
         cls.proc_client.start()
-        time.sleep(0.01)
+        cls._poll(lambda clients: 'test' in clients)
+        pass
+
+    @classmethod
+    def _poll(cls, ready):
+        for _ in range(100):
+            try:
+                if ready( tap.Connector(transport='tcp').list_all() ): break
+            except ConnectionRefusedError:
+                pass
+            time.sleep(0.01)
         pass
 
     @classmethod
@@ -62,6 +116,24 @@ class TapTestCase(TestCase):
         pass
     pass
 
+class ChannelTestCase(TestCase):
+    ## a pair of channels over a socketpair, with the streams opened by local served in `on_open`
+    def setUp(self):
+        sock1, sock2 = socket.socketpair()
+        self.local = tap.Channel(sock1, 'local')
+        self.remote = tap.Channel(sock2, 'remote', on_open=self.on_open)
+        for channel in [self.local, self.remote]:
+            threading.Thread(target=channel.service, daemon=True).start()
+        pass
+
+    def tearDown(self):
+        self.local.close()
+        self.remote.close()
+
+    def on_open(self, stream):
+        pass
+    pass
+
 class TestListAllClients(TapTestCase):
     def test_list_all_no_client_name(self):
         console = tap.Connector()
@@ -185,6 +257,676 @@ class TestReload(TapTestCase):
         tap.Connector().reload()
         tap.Connector('test').reload()
 
+class TestProcessSupervisor(TestCase):
+    def test_lazy_start(self):
+        supervisor = tap.ProcessSupervisor()
+        self.assertIsNone(supervisor.thread)
+
+    def test_exit_and_timeout(self):
+        supervisor = tap.ProcessSupervisor()
+        job = supervisor.spawn(['echo done', 'sleep 5'], 0.2)
+        self.assertTrue( job.wait(2) )
+        self.assertEqual(job.returns[0], 0)
+        self.assertEqual(job.stdout(0).strip(), 'done')
+        self.assertEqual(job.expired, [False, True])
+
+class TestSupervisedExecution(TapTestCase):
+    def test_execute_timeout(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_sleep', {'t':2}, timeout=0.1)
+        time.sleep(0.5)
+        with self.assertRaises(tap.TimeoutException):
+            c.fetch(tid)
+    pass
+
+class TestOutputBuffer(TestCase):
+    def test_ring_offsets(self):
+        buffer = tap.OutputBuffer(limit=4)
+        buffer.write(b'abcdef')
+        self.assertEqual(buffer.read(0), (b'cdef', 6))
+        self.assertEqual(buffer.read(5), (b'f', 6))
+
+    def test_read_text_boundary(self):
+        buffer, text, offset = tap.OutputBuffer(), '', 0
+        for x in 'aé€😀'.encode():
+            buffer.write( bytes([x]) )
+            data, offset = buffer.read_text(offset)
+            text += data
+        self.assertEqual(text, 'aé€😀')
+        self.assertEqual(offset, 10)
+
+class TestTail(TapTestCase):
+    def test_tail_running(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_sleep', {'t':0.3})
+        text, offset = '', 0
+        while True:
+            res = c.tail(tid, offset)
+            text, offset = text + res['data'], res['offset']
+            if res['done'] and not res['data']: break
+            time.sleep(0.05)
+        self.assertEqual(text, 'begin\nend\n')
+    pass
+
+class TestBlockingFetch(TapTestCase):
+    def test_fetch_block(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_sleep', {'t':0.2})
+        res = c.fetch(tid, block=True)
+        self.assertEqual(res['output'], 'end')
+
+    def test_fetch_block_timeout(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_sleep', {'t':1})
+        with self.assertRaises(tap.NoResponseException):
+            c.fetch(tid, block=True, timeout=0.05)
+
+    def test_wait_any_all(self):
+        c = tap.Connector('test')
+        tid1, tid2 = c.execute('test_sleep', {'t':0.1}), c.execute('test_sleep', {'t':0.4})
+        self.assertEqual(c.wait_any([tid1, tid2]), [tid1])
+        self.assertEqual(sorted(c.wait_all([tid1, tid2])), sorted([tid1, tid2]))
+
+    def test_blocking_not_starving(self):
+        tid = tap.Connector('test').execute('test_sleep', {'t':1})
+        waiters = [ threading.Thread(target=tap.Connector('test').fetch, args=(tid, True)) for _ in range(20) ]
+        [ x.start() for x in waiters ]
+        time.sleep(0.1)
+        _start = time.time()
+        tap.Connector('test').describe()
+        self.assertLess(time.time() - _start, 0.5)
+        [ x.join() for x in waiters ]
+    pass
+
+class TestConcurrentDispatch(TapTestCase):
+    def test_concurrent_requests(self):
+        results = list()
+        def _describe():
+            results.append( tap.Connector('test').describe() )
+        workers = [ threading.Thread(target=_describe) for _ in range(8) ]
+        [ x.start() for x in workers ]
+        [ x.join() for x in workers ]
+        self.assertEqual(len(results), 8)
+        self.assertTrue( all('test_sleep' in x for x in results) )
+
+    def test_reply_matching(self):
+        c = tap.Connector('test')
+        for function in ['test_command_index', 'test_sleep', 'test_no_action']:
+            self.assertEqual(c.info(function)['description'], function)
+    pass
+
+class TestStreamTransport(TapTestCase):
+    def test_tcp(self):
+        c = tap.Connector('test', transport='tcp')
+        tid = c.execute('test_no_parameters')
+        self.assertIn('output', c.fetch(tid, block=True))
+
+    def test_unix(self):
+        c = tap.Connector('test', transport='unix')
+        tid = c.execute('test_no_parameters')
+        self.assertIn('output', c.fetch(tid, block=True))
+
+    def test_invalid_transport(self):
+        with self.assertRaises(tap.InvalidRequestException):
+            tap.Connector('test', transport='???')
+    pass
+
+class TestChannel(ChannelTestCase):
+    def on_open(self, stream):
+        stream.send( stream.recv() ) #echo
+        stream.close()
+
+    def test_multiplexed_streams(self):
+        streams = [ self.local.open() for _ in range(8) ]
+        for i,stream in enumerate(streams):
+            stream.send(f'stream-{i}')
+        for i,stream in enumerate(streams):
+            self.assertEqual(bytes(stream.recv(1)), f'stream-{i}'.encode())
+
+    def test_unknown_stream_dropped(self):
+        self.local.send(12345, b'stale') #never opened
+        stream = self.local.open()
+        stream.send(b'fresh')
+        self.assertEqual(bytes(stream.recv(1)), b'fresh')
+        self.assertNotIn(12345, self.remote.streams)
+
+    def test_close_fails_streams(self):
+        stream = self.local.open()
+        self.remote.close()
+        with self.assertRaises(tap.ClientConnectionLossException):
+            stream.recv(1)
+    pass
+
+class TestFraming(TestCase):
+    def test_tagged_roundtrip(self):
+        sock1, sock2 = socket.socketpair()
+        payload = bytes(range(256)) * 4096
+        threading.Thread(target=tap._send, args=(sock1, payload, 7)).start()
+        rid, msg = tap._recv_tagged(sock2)
+        self.assertEqual((rid, bytes(msg)), (7, payload))
+        sock1.close(); sock2.close()
+
+    def test_untagged_roundtrip(self):
+        sock1, sock2 = socket.socketpair()
+        tap._send(sock1, {'request':'list_all'})
+        self.assertEqual(tap._decode(tap._recv(sock2)), {'request':'list_all'})
+        sock1.close(); sock2.close()
+
+    def test_closed_midway(self):
+        sock1, sock2 = socket.socketpair()
+        sock1.sendall( tap.FRAME_HEADER.pack(100, 1) )
+        sock1.close()
+        with self.assertRaises(ConnectionResetError):
+            tap._recv_tagged(sock2)
+        sock2.close()
+    pass
+
+class TestWireEncoding(TestCase):
+    def test_roundtrip(self):
+        msg = {'request':'execute', 'client':'a@b', 'args':{'parameters':{'p1':1, 'p2':[1.5, 'x##y']}}}
+        self.assertEqual(tap._decode(tap._encode(msg)), msg)
+        self.assertEqual(tap._encode(b'raw'), b'raw')
+    pass
+
+class TestStructuredRequest(TapTestCase):
+    def test_separators_in_payload(self):
+        cc = tap.Connector()
+        res = ( cc.batch('test', 'test_argv', {'msg':'a@b'})
+                  .batch('test', 'test_argv', {'msg':'c##d'})
+                  .fetch(block=True) ).apply()
+        self.assertEqual([ x['output'] for x in res ], ['a@b', 'c##d'])
+    pass
+
+class TestFileDigest(TestCase):
+    def test_block_digests(self):
+        with tempfile.NamedTemporaryFile() as fh:
+            fh.write( b'x' * (tap.BLOCK_SIZE*2 + 10) )
+            fh.flush()
+            size, file_hash, block_hashes = tap._file_digest( Path(fh.name) )
+        self.assertEqual(size, tap.BLOCK_SIZE*2 + 10)
+        self.assertEqual(len(block_hashes), 3)
+        self.assertEqual(block_hashes[0], block_hashes[1])
+        self.assertNotEqual(block_hashes[1], block_hashes[2])
+
+class TestIncrementalSync(TapTestCase):
+    def test_sync_unchanged(self):
+        res = tap.Connector('test').sync_code('example')
+        self.assertEqual(res['files_skipped'], 1)
+        self.assertEqual(res['bytes_sent'], 0)
+
+    def test_sync_wrong_codebase(self):
+        with self.assertRaises(tap.CodebaseNonExistException):
+            tap.Connector('test').sync_code('???')
+    pass
+
+class TestFileTransfer(ChannelTestCase):
+    def setUp(self):
+        self.cwd, self.tmp = os.getcwd(), tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.opened = Queue()
+        super().setUp()
+        pass
+
+    def tearDown(self):
+        super().tearDown()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def on_open(self, stream):
+        self.opened.put(stream)
+
+    def _send(self, data:bytes, sha256:str):
+        Path('source.bin').write_bytes(data)
+        stream = self.local.open()
+        stream.send({ 'name':'data/target.bin', 'size':len(data), 'sha256':sha256,
+                      'blocks':None, 'mode':0o644, 'compress':None })
+        with open('source.bin', 'rb') as fd:
+            stream.sendfile(fd, 0, len(data))
+        stream.send('')
+        return self.opened.get(timeout=1)
+
+    def test_sendfile_received(self):
+        data = os.urandom(100000)
+        tap._recv_file( self._send(data, hashlib.sha256(data).hexdigest()), 'data/*' )
+        self.assertEqual(Path('data/target.bin').read_bytes(), data)
+
+    def test_verification_failed(self):
+        with self.assertRaises(tap.FileIntegrityException):
+            tap._recv_file( self._send(b'x'*1000, '0'*64), 'data/*' )
+        self.assertEqual(list(Path('data').iterdir()), [])
+    pass
+
+class TestCompression(TestCase):
+    def _choose(self, data:bytes, compress:str, supported:list):
+        with tempfile.TemporaryFile() as fd:
+            fd.write(data); fd.seek(0)
+            return tap._choose_compress(fd, compress, None, supported)
+
+    def test_choose_compress(self):
+        text = b'hello world\n' * 10000
+        self.assertEqual(self._choose(text, 'auto', ['zlib']), 'zlib')
+        self.assertIsNone( self._choose(text, 'zlib', []) )
+        self.assertIsNone( self._choose(text, 'none', ['zlib']) )
+        self.assertIsNone( self._choose(os.urandom(100000), 'auto', ['zlib']) )
+
+    def test_compressors_roundtrip(self):
+        data = b'hello world\n' * 1000
+        for compress,decompress in tap.COMPRESSORS.values():
+            self.assertEqual(decompress( compress(data, None) ), data)
+    pass
+
+class TestSharedFiles(TestCase):
+    def test_bounded_cache(self):
+        with tempfile.NamedTemporaryFile() as fh:
+            fh.write( os.urandom(300000) )
+            fh.flush()
+            shared, path = tap.SharedFiles(max_bytes=250000), Path(fh.name)
+            chunks = [ shared.compressed(path, i, 100000, 'zlib', 1) for i in range(0, 300000, 100000) ]
+            self.assertEqual(zlib.decompress(chunks[0]), path.read_bytes()[:100000])
+            self.assertLessEqual(shared.nbytes, 250000)
+            self.assertEqual(len(shared.chunks), 2)
+            self.assertIs(shared.compressed(path, 200000, 100000, 'zlib', 1), chunks[2])
+            shared.close()
+
+class TestFanOutSync(TapTestCase):
+    def test_sync_all(self):
+        res = tap.Connector().sync_code_all('example')
+        self.assertEqual(res['test']['files_skipped'], 1)
+
+    def test_sync_all_wrong_client(self):
+        res = tap.Connector().sync_code_all('example', clients=['???'])
+        self.assertEqual(res['???']['err'][0], 'ClientNotFoundException')
+    pass
+
+class TestDiscovery(TestCase):
+    def test_scan(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        client = tap.SlaveDaemon(listener.getsockname()[1], MANIFEST, '127.0.0.1')
+        found = client.scan(['127.0.0.2', '127.0.0.1'])
+        self.assertIsNotNone(found)
+        self.assertEqual(found.getpeername(), listener.getsockname())
+        found.close()
+        listener.close()
+
+    def test_discover_malformed(self):
+        replies = [ b'[1, 2]', tap._encode({'port':4242})[:6], tap._encode({'port':'x'}),
+                    tap._encode({'port':4242}) ]
+        beacon = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        beacon.bind(('127.0.0.1', tap.BEACON_PORT))
+        def _reply():
+            for reply in replies:
+                _, addr = beacon.recvfrom(tap.BUFFER_SIZE)
+                beacon.sendto(reply, addr)
+        threading.Thread(target=_reply, daemon=True).start()
+        client = tap.SlaveDaemon(tap.SERVER_PORT, MANIFEST, '127.0.0.1')
+        self.assertIsNone( client.discover('127.0.0.1') )
+        self.assertEqual(client.discover('127.0.0.1'), ('127.0.0.1', 4242))
+        beacon.close()
+    pass
+
+class TestHeartbeat(ChannelTestCase):
+    def test_ping_pong(self):
+        _alive = time.monotonic()
+        time.sleep(0.01)
+        self.local.ping()
+        time.sleep(0.05)
+        self.assertGreater(self.remote.alive, _alive)
+        self.assertGreater(self.local.alive, _alive)
+
+    def test_transfer_progress(self):
+        self.local.alive = self.remote.alive = 0
+        self.local.open().send( bytes(4*1024*1024) )
+        time.sleep(0.05)
+        self.assertGreater(self.local.alive, 0)
+        self.assertGreater(self.remote.alive, 0)
+    pass
+
+class TestClientEviction(TapTestCase):
+    server_args = { 'heartbeat':(0.2, 3) }
+
+    def test_silent_client(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_sleep', {'t':2})
+        os.kill(self.proc_client.pid, signal.SIGSTOP)
+        self.addCleanup(os.kill, self.proc_client.pid, signal.SIGCONT)
+        t0 = time.time()
+        with self.assertRaises(tap.ClientConnectionLossException):
+            c.fetch(tid, block=True)
+        self.assertLess(time.time()-t0, 0.2*3 + 0.2*2) #missed, and found on the next check
+        self.assertNotIn('test', c.list_all())
+    pass
+
+class TestTaskPool(TestCase):
+    def _pool(self, **kwargs):
+        pool = tap.TaskPool(**kwargs)
+        for i in range(5):
+            pool[str(i)] = { 'state':'running' }
+            pool[str(i)]['results'] = { 'i':i }
+            pool.complete(str(i))
+        return pool
+
+    def test_spill_oldest(self):
+        pool = self._pool(max_entries=2)
+        self.assertEqual(list(pool.tasks), ['3', '4'])
+        self.assertEqual(pool['0']['results'], {'i':0})
+        self.assertIn('1', pool)
+        self.assertNotIn('???', pool)
+        self.assertEqual(list(pool.tasks), ['3', '4']) #lookups are read-only
+
+    def test_running_never_spilled(self):
+        pool = self._pool(max_entries=2)
+        pool['5'] = { 'state':'running' }
+        self.assertIn('5', pool.tasks)
+
+    def test_ttl_after_fetch(self):
+        pool = self._pool(max_entries=2, ttl=0.05)
+        pool.fetched('0')
+        pool.fetched('4')
+        time.sleep(0.1)
+        pool.complete('3')
+        self.assertNotIn('0', pool)
+        self.assertNotIn('4', pool)
+        self.assertIn('1', pool)
+        with self.assertRaises(tap.KeyError):
+            pool['0']
+    pass
+
+class TestAdmissionControl(TapTestCase):
+    def test_concurrency_and_priority(self):
+        c = tap.Connector('test')
+        tid1 = c.execute('test_serial')
+        tid2 = c.execute('test_serial')
+        tid3 = c.execute('test_serial', priority=1)
+        self.assertEqual(c.status(tid1)['state'], 'running')
+        self.assertEqual(c.status(tid3), {'state':'queued', 'position':0})
+        self.assertEqual(c.status(tid2), {'state':'queued', 'position':1})
+        self.assertEqual(sorted(c.wait_all([tid1, tid2, tid3], timeout=2)), sorted([tid1, tid2, tid3]))
+    pass
+
+class TestArgvCommand(TapTestCase):
+    def test_no_shell(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_argv')
+        self.assertEqual(c.fetch(tid, block=True)['output'], 'a b; echo c')
+
+    def test_missing_program(self):
+        supervisor, marker = tap.ProcessSupervisor(), os.urandom(8).hex()
+        with self.assertRaises(FileNotFoundError):
+            supervisor.spawn([f'sleep 30 # {marker}', ['???-not-a-program']], 1)
+        ## the commands started ahead are not left running
+        for path in Path('/proc').glob('[0-9]*/cmdline'):
+            try:
+                self.assertNotIn(marker.encode(), path.read_bytes())
+            except OSError:
+                pass
+    pass
+
+class TestOutputMatch(TestCase):
+    def test_typed(self):
+        self.assertEqual(tap._match('x 1\nx 2\n', re.compile('x (\\d)'), 'int'), [1, 2])
+        self.assertEqual(tap._match('x 1.5\n', re.compile('x (\\S+)'), 'float'), 1.5)
+        self.assertEqual(tap._match('x 1\n', re.compile('x (\\d)')), '1')
+        self.assertEqual(tap._match('y\n', re.compile('x (\\d)'), 'int'), '')
+
+    def test_named(self):
+        pattern = re.compile('(?P<a>\\d+)-(?P<b>\\d+)')
+        self.assertEqual(tap._match('1-2 3-4', pattern, 'int'), {'a':1, 'b':2})
+        self.assertEqual(tap._match('none', pattern), '')
+    pass
+
+class TestInProcessOutputs(TapTestCase):
+    def test_source_and_stream(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_match')
+        res = c.fetch(tid, block=True)
+        self.assertEqual(res['rate'], [1.5, 2.5])
+        self.assertEqual(res['named'], {'r':1.5, 'n':3.0})
+        self.assertEqual(res['code'], 7)
+    pass
+
+class TestTemplate(TestCase):
+    def test_bind(self):
+        template = tap.Template('echo $p1-$p10-$p1x-$$')
+        self.assertEqual(template.bind({'p1':'A', 'p10':'B'}), 'echo A-B-$p1x-$$')
+
+    def test_defaults_not_mutated(self):
+        func = tap.FunctionTemplate( MANIFEST['functions']['test_command_index'] )
+        commands, values = func.bind({'p1':5, 'extra':0})
+        self.assertEqual(commands, ['echo 5', 'echo 2', 'echo 3.3'])
+        self.assertEqual(values['extra'], 0)
+        self.assertEqual(func.bind({})[0], ['echo 1', 'echo 2', 'echo 3.3'])
+        self.assertNotIn('extra', func.defaults)
+
+    def test_compile_manifest(self):
+        version, functions = tap._compile_manifest(MANIFEST)
+        _version, _functions = tap._compile_manifest(MANIFEST)
+        self.assertEqual(version, _version)
+        self.assertIs(functions['test_argv'], _functions['test_argv'])
+        ##
+        manifest = dict(MANIFEST, name='other')
+        self.assertNotEqual(tap._compile_manifest(manifest)[0], version)
+    pass
+
+class TestCompiledExecution(TapTestCase):
+    def test_version(self):
+        version, _ = tap._compile_manifest(MANIFEST)
+        self.assertEqual(tap.Connector('test').describe()['__version__'], version)
+
+    def test_no_leaking_parameters(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_argv', {'msg':'$msg'})
+        self.assertEqual(c.fetch(tid, block=True)['output'], '$msg')
+        tid = c.execute('test_argv')
+        self.assertEqual(c.fetch(tid, block=True)['output'], 'a b; echo c')
+    pass
+
+class TestManifestUpdate(TapTestCase):
+    def _manifest(self, fn):
+        functions = dict(MANIFEST['functions'])
+        functions[fn] = {"description":fn}
+        return dict(MANIFEST, functions=functions)
+
+    def test_push_manifest(self):
+        self.addCleanup(os.remove, 'manifest.json')
+        c = tap.Connector('test')
+        version = c.describe()['__version__']
+        res = c.push_manifest(self._manifest('test_pushed'), ['test', '???'])
+        self.assertIn('version', res['test'])
+        self.assertIn('err', res['???'])
+        ## the cached response is revalidated with the new version
+        res = c.describe()
+        self.assertNotEqual(res['__version__'], version)
+        self.assertEqual(res['test_pushed'], 'test_pushed')
+        self.assertEqual(c.describe(), res)
+
+    def test_push_large_manifest(self):
+        self.addCleanup(os.remove, 'manifest.json')
+        manifest = self._manifest('test_pushed')
+        manifest['functions']['test_pushed']['description'] = 'x' * 2 * tap.BUFFER_SIZE
+        with self.assertRaises(tap.InvalidRequestException):
+            tap.Connector('test').push_manifest(manifest, ['test'])
+        res = tap.Connector('test', transport='tcp').push_manifest(manifest, ['test'])
+        self.assertIn('version', res['test'])
+
+    def test_watch(self):
+        self.addCleanup(os.remove, 'manifest.json')
+        with open('manifest.json', 'w') as fh:
+            json.dump(self._manifest('test_watched'), fh)
+        c = tap.Connector('test')
+        for _ in range(30):
+            if 'test_watched' in c.describe(): break
+            time.sleep(0.1)
+        self.assertIn('test_watched', c.describe())
+    pass
+
+class TestBatchFetch(TapTestCase):
+    def test_enqueue_order(self):
+        cc = tap.Connector()
+        res = ( cc.batch('test', 'test_argv', {'msg':'1'})
+                  .batch('', 'test_argv', {'msg':'2'})
+                  .batch('test', 'test_argv', {'msg':'3'})
+                  .fetch(block=True) ).apply()
+        self.assertEqual([ x['output'] for x in res ], ['1', '2', '3'])
+
+    def test_errors_in_place(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_argv')
+        tid_list = [ ('test', tid), ('test', '???'), ('???', '???'), ('test', tid) ]
+        res = c.handle('batch_fetch', {'tid_list':tid_list, 'block':True, 'timeout':-1})['results']
+        self.assertEqual(len(res), 4)
+        self.assertEqual(res[0]['output'], 'a b; echo c')
+        self.assertIn('err', res[1])
+        self.assertIn('err', res[2])
+        self.assertEqual(res[3], res[0])
+    pass
+
+class TestPipeline(TapTestCase):
+    def test_ready(self):
+        cc, t0 = tap.Connector(), time.time()
+        res = ( cc.batch('test', 'test_sleep', {'t':0.3}, tag='rx')
+                  .batch('test', 'test_sleep', {'t':0.3}, ready={'rx':'begin'})
+                  .fetch(block=True) ).apply()
+        self.assertEqual(res, [{'output':'end'}, {'output':'end'}])
+        self.assertLess(time.time()-t0, 0.55)
+
+    def test_after(self):
+        cc, t0 = tap.Connector(), time.time()
+        res = ( cc.batch('test', 'test_sleep', {'t':0.3}, tag='rx')
+                  .batch('', 'test_sleep', {'t':0.3}, after='rx')
+                  .fetch(block=True) ).apply()
+        self.assertEqual(res, [{'output':'end'}, {'output':'end'}])
+        self.assertGreaterEqual(time.time()-t0, 0.6)
+
+    def test_failed_dependency(self):
+        cc = tap.Connector()
+        res = ( cc.batch('test', 'test_sleep', {'t':1}, timeout=0.1, tag='rx')
+                  .batch('test', 'test_argv', after=['rx'])
+                  .fetch(block=True) ).apply()
+        self.assertEqual(res[0]['err'][0], 'TimeoutException')
+        self.assertEqual(res[1]['err'][0], 'DependencyFailureException')
+
+    def test_unknown_tag(self):
+        with self.assertRaises(tap.InvalidRequestException):
+            tap.Connector().batch('test', 'test_argv', after='???').apply()
+    pass
+
+class TestScheduledStart(TapTestCase):
+    def test_sync_clock(self):
+        res = tap.Connector().sync_clock(['test', '???'])
+        self.assertLess(abs(res['test']['offset']), 0.05)
+        self.assertGreaterEqual(res['test']['rtt'], 0)
+        self.assertIn('err', res['???'])
+
+    def test_start_at(self):
+        c = tap.Connector('test')
+        tid = c.execute('test_argv', start_at=time.time()+0.3)
+        self.assertEqual(c.status(tid)['state'], 'scheduled')
+        ## the scheduled task holds no slot of the immediate ones
+        _tid = c.execute('test_argv')
+        self.assertEqual(c.fetch(_tid, block=True, timeout=0.2)['output'], 'a b; echo c')
+        self.assertEqual(c.status(tid)['state'], 'scheduled')
+        res = c.fetch(tid, block=True)
+        self.assertEqual(res['output'], 'a b; echo c')
+        self.assertLess(abs(res['__start_error__']), 0.05)
+    pass
+
+class TestAsyncConnector(TapTestCase):
+    def test_gather(self):
+        async def _run():
+            async with tap.AsyncConnector('test') as conn:
+                tids = await asyncio.gather(*[ conn.execute('test_argv', {'msg':str(i)}) for i in range(10) ])
+                return await asyncio.gather(*[ conn.fetch(tid, block=True) for tid in tids ])
+        res = asyncio.run( _run() )
+        self.assertEqual([ x['output'] for x in res ], [ str(i) for i in range(10) ])
+
+    def test_errors(self):
+        async def _run():
+            async with tap.AsyncConnector('test') as conn:
+                with self.assertRaises(tap.ClientNotFoundException):
+                    await conn.describe('???')
+                self.assertIn('test', await conn.list_all())
+        asyncio.run( _run() )
+
+    def test_cancelled_request(self):
+        async def _run():
+            async with tap.AsyncConnector('test') as conn:
+                tid = await conn.execute('test_sleep', {'t':0.5})
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(conn.fetch(tid, block=True), 0.1)
+                self.assertEqual(conn.pending, {})
+                self.assertEqual((await conn.fetch(tid, block=True))['output'], 'end')
+        asyncio.run( _run() )
+    pass
+
+class TestResultStore(TestCase):
+    def _event(self, tid, function, started, outputs):
+        return { 'tid':tid, 'function':function, 'parameters':{'t':1},
+                 'started':started, 'ended':started+1, 'outputs':outputs }
+
+    def test_record_and_query(self):
+        store = tap.ResultStore(':memory:')
+        store.record('a', self._event('1', 'rx', 10.0, {'throughput':1.5}))
+        store.record('b', self._event('2', 'rx', 20.0, {'throughput':2.5}))
+        store.record('b', self._event('3', 'tx', 30.0, {'length':3}))
+        ##
+        self.assertEqual([ x['tid'] for x in store.query() ], ['1', '2', '3'])
+        self.assertEqual([ x['tid'] for x in store.query(client='b') ], ['2', '3'])
+        self.assertEqual([ x['tid'] for x in store.query(function='rx', since=15) ], ['2'])
+        self.assertEqual([ x['tid'] for x in store.query(until=30, limit=1) ], ['1'])
+        res = store.query(outputs=['throughput'])
+        self.assertEqual([ x['outputs'] for x in res ], [{'throughput':1.5}, {'throughput':2.5}])
+        self.assertEqual(res[0]['parameters'], {'t':1})
+
+    def test_bad_record(self):
+        store = tap.ResultStore(':memory:')
+        store.record('a', {'tid':'1'})
+        store.record('a', self._event('2', 'rx', 10.0, {'output':object()}))
+        self.assertEqual(store.query(), [])
+    pass
+
+class TestResultRecording(TapTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.server_args = { 'store':os.path.join(cls.tmp.name, 'results.db') }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.tmp.cleanup()
+
+    def _query(self, **kwargs):
+        ## the results of client are reported as the one-way events after completion
+        for _ in range(100):
+            res = tap.Connector().query(**kwargs)
+            if res: return res
+            time.sleep(0.01)
+        return res
+
+    def test_query(self):
+        c, cc = tap.Connector('test'), tap.Connector()
+        c.fetch(c.execute('test_match'), block=True)
+        cc.fetch(cc.execute('test_argv'), block=True)
+        ##
+        res = self._query(client='test', outputs=['rate'])
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0]['function'], 'test_match')
+        self.assertEqual(res[0]['outputs'], {'rate':[1.5, 2.5]})
+        self.assertLessEqual(res[0]['started'], res[0]['ended'])
+        res = self._query(client='', function='test_argv')
+        self.assertEqual([ x['outputs'] for x in res ], [{'output':'a b; echo c'}])
+        self.assertEqual(res[0]['parameters'], {'msg':'a b; echo c'})
+    pass
+
+class TestResultQuery(TapTestCase):
+    def test_store_disabled(self):
+        with self.assertRaises(tap.InvalidRequestException):
+            tap.Connector().query(function='test_argv')
+    pass
+
 
 if __name__=='__main__':
     unittest.main()
\ No newline at end of file
@@ -1,30 +1,78 @@
 #!/usr/bin/env python3
 from abc import abstractmethod
 import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as futures_wait
+from functools import lru_cache
+import hashlib
+import heapq
 import ipaddress
+import itertools
 import json
+import mmap
 import os
 from pathlib import Path
 import random
 import re
+import selectors
 import shutil
+import signal
 import socket
+import sqlite3
 import string
 import struct
 import subprocess as sp
-from tempfile import NamedTemporaryFile
+import tempfile
 import threading
 import time
 import traceback
-from queue import Queue
+import zlib
+from queue import Queue, Empty
 
 SERVER_PORT = 11112
+BEACON_PORT = 11113
 IPC_PORT    = 52525
-CHUNK_SIZE  = 4096
+IPC_UNIX_PATH = '/tmp/tap-{port}.sock'
+CHUNK_SIZE  = 1024*1024
+BLOCK_SIZE  = 1024*1024
 BUFFER_SIZE = 10240
+SEND_QUANTUM = 256*1024
+IPC_WORKERS = 16
+PROXY_WORKERS = 64
+SLAVE_WORKERS = 16
+POLL_INTERVAL = 0.05
+SCAN_TIMEOUT  = 0.1
+SCAN_WORKERS  = 256
+BEACON_TIMEOUT = 0.3
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_MISS     = 3
+WATCH_INTERVAL     = 1.0
+CLOCK_SAMPLES      = 8
+CLOCK_MAX_AGE      = 60.0
+SCHEDULE_LEAD      = 0.05
+TASK_MAX_ENTRIES = 1024
+TASK_MAX_BYTES   = 64*1024*1024
+TASK_TTL         = 600.0
+EXEC_WORKERS     = 32
+SYNC_TIMEOUT  = 60.0
+SAMPLE_SIZE   = 65536
+OUTPUT_LIMIT  = 4*1024*1024
+SHARED_CACHE_BYTES = 64*1024*1024
+
+COMPRESSORS = {
+    'zlib': ( lambda x,level: zlib.compress(x, 6 if level is None else level), zlib.decompress )
+}
+try:
+    import lzma
+    COMPRESSORS['lzma'] = ( lambda x,level: lzma.compress(x, preset=level), lzma.decompress )
+except ImportError:
+    pass
 
 GEN_TID = lambda: ''.join([random.choice(string.ascii_letters) for _ in range(8)])
-SHELL_POPEN = lambda x: sp.Popen(x, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+SHELL_POPEN = lambda x: sp.Popen(x, stdout=sp.PIPE, stderr=sp.PIPE, shell=True, start_new_session=True)
+## absolute path with `close_fds=False` enables `posix_spawn` in `subprocess` (fds are non-inheritable by default)
+ARGV_POPEN = lambda x: sp.Popen([shutil.which(x[0]) or x[0], *x[1:]], stdout=sp.PIPE, stderr=sp.PIPE, close_fds=False)
 SHELL_RUN = lambda x: sp.run(x, stdout=sp.PIPE, stderr=sp.PIPE, check=True, shell=True)
 
 class KeyError(Exception): pass #override `KeyError`
@@ -36,6 +84,8 @@ class AutoDetectFailureException(Exception): pass
 class ClientConnectionLossException(Exception): pass
 class ClientNotFoundException(Exception): pass
 class CodebaseNonExistException(Exception): pass
+class FileIntegrityException(Exception): pass
+class DependencyFailureException(Exception): pass
 
 class UntangledException(Exception):
     def __init__(self, args):
@@ -51,32 +101,41 @@ class UntangledException(Exception):
         return (err_cls, err_msg)
     pass
 
-def _frag_recv(sock: socket.socket):
-    _msg = sock.recv(BUFFER_SIZE)
-    _len = struct.unpack('I', _msg[:4])[0]
-    _msg = _msg[4:]
-    ##
-    while len(_msg) < _len:
-        remains = sock.recv(BUFFER_SIZE)
-        _msg += remains
+FRAG_HEADER = struct.Struct('III') #(rid, total length, offset)
+
+def _frag_recv(sock: socket.socket, rid:int):
+    _msg, _len, _recv_len = bytearray(), -1, 0
+    while _recv_len < _len or _len < 0:
+        frag = sock.recv(FRAG_HEADER.size + BUFFER_SIZE)
+        _rid, _total, _offset = FRAG_HEADER.unpack_from(frag)
+        if _rid != rid: continue #stale reply of previous request
+        if _len < 0:
+            _msg, _len = bytearray(_total), _total
+        _frag = memoryview(frag)[FRAG_HEADER.size:]
+        _msg[_offset:_offset+len(_frag)] = _frag
+        _recv_len += len(_frag)
     return _msg
 
-def _frag_send(sock:socket.socket, msg: bytes, target):
-    _len = struct.pack('I', len(msg))
-    _msg = _len + msg
-    ##
-    _num = len(_msg) // BUFFER_SIZE
-    for i in range(_num):
-        sock.sendto(_msg[i*BUFFER_SIZE:(i+1)*BUFFER_SIZE], target)
-    sock.sendto(_msg[_num*BUFFER_SIZE:], target)
+def _frag_send(sock:socket.socket, msg: bytes, target, rid:int):
+    _len, _view = len(msg), memoryview(msg)
+    for _offset in range(0, max(_len,1), BUFFER_SIZE):
+        _header = FRAG_HEADER.pack(rid, _len, _offset)
+        sock.sendmsg([_header, _view[_offset:_offset+BUFFER_SIZE]], [], 0, target)
     pass
 
-def _fixed_recv(sock:socket.socket, length):
-    data = sock.recv(length)
-    while len(data) < length:
-        remains = sock.recv(length - len(data))
-        if not remains: break
-        data += remains
+FRAME_HEADER = struct.Struct('II') #(length, rid)
+CONTROL_RID = 0xFFFFFFFF #one-way events from the peer
+OPEN_FLAG   = 0x80000000 #tagged on the first frame of a stream
+
+def _fixed_recv(sock:socket.socket, length, on_progress=None) -> bytearray:
+    data = bytearray(length)
+    view, received = memoryview(data), 0
+    while received < length:
+        _len = sock.recv_into(view[received:], length - received)
+        if not _len:
+            raise ConnectionResetError(f'connection closed with {length-received} bytes unreceived.')
+        received += _len
+        if on_progress: on_progress()
     return data
 
 def _recv(sock:socket.socket):
@@ -84,165 +143,1031 @@ def _recv(sock:socket.socket):
     _msg = _fixed_recv(sock,_len)
     return _msg
 
-def _send(sock:socket.socket, msg):
-    if isinstance(msg, bytes):
-        _msg = msg
+def _recv_tagged(sock:socket.socket, on_progress=None):
+    _len, rid = FRAME_HEADER.unpack( _fixed_recv(sock, FRAME_HEADER.size, on_progress) )
+    _msg = _fixed_recv(sock, _len - 4, on_progress)
+    return rid, _msg
+
+def _head_of(buffers:list, limit:int) -> list:
+    head, total = list(), 0
+    for x in buffers:
+        if total >= limit: break
+        head.append( x[:limit-total] )
+        total += len(head[-1])
+    return head
+
+def _sendall(sock:socket.socket, buffers:list, on_progress=None):
+    buffers = [ memoryview(x).cast('B') for x in buffers if len(x) ]
+    while buffers:
+        if on_progress: #bounded sends, to report the progress
+            sent = sock.sendmsg( _head_of(buffers, SEND_QUANTUM) )
+            on_progress()
+        else:
+            sent = sock.sendmsg(buffers)
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers: buffers[0] = buffers[0][sent:]
+    pass
+
+def _encode(msg) -> bytes:
+    if isinstance(msg, (bytes, bytearray, memoryview)):
+        return msg
     elif isinstance(msg, str):
-        _msg = msg.encode()
+        return msg.encode()
     else:
-        _msg = json.dumps(msg).encode()
+        return json.dumps(msg, separators=(',',':')).encode()
+
+def _decode(msg):
+    '''Decode the structured message, i.e., `{request, client, args}` or the response.'''
+    return json.loads(msg)
+
+def _send(sock:socket.socket, msg, rid=None, on_progress=None):
+    _msg = _encode(msg)
     ##
-    _len = struct.pack('I', len(_msg))
-    _msg = _len + _msg
-    sock.send(_msg)
+    if rid is None:
+        _header = struct.pack('I', len(_msg))
+    else:
+        _header = FRAME_HEADER.pack(len(_msg)+4, rid)
+    _sendall(sock, [_header, _msg], on_progress)
+    pass
+
+class Stream:
+    """One request stream multiplexed on the `Channel`, used as a message-oriented socket."""
+    __slots__ = ['channel', 'rid', 'inbox', 'opened']
+    def __init__(self, channel:'Channel', rid:int, opened:bool=False):
+        self.channel, self.rid = channel, rid
+        self.inbox = Queue()
+        self.opened = opened
+        pass
+
+    def _tag(self) -> int:
+        ## the first frame opens the stream on the peer
+        rid = self.rid if self.opened else self.rid | OPEN_FLAG
+        self.opened = True
+        return rid
+
+    def send(self, msg):
+        self.channel.send(self._tag(), msg)
+        pass
+
+    def sendfile(self, fd, offset:int, count:int):
+        self.channel.sendfile(self._tag(), fd, offset, count)
+        pass
+
+    def recv(self, timeout=None) -> bytes:
+        try:
+            _msg = self.inbox.get(timeout=timeout)
+        except Empty:
+            raise TimeoutException(f'stream {self.rid} idle for {timeout} seconds.')
+        if _msg is None:
+            raise ClientConnectionLossException(f'{self.channel.name} disconnected.')
+        return _msg
+
+    def close(self):
+        self.channel.streams.pop(self.rid, None)
+        pass
     pass
 
-def _sync(sock:socket.socket, msg):
-    _send(sock, msg)
-    _msg = _recv(sock).decode()
-    _msg = json.loads(_msg)
+class Channel:
+    """Multiplexed request streams over one stream socket, with each frame tagged by the stream ID.
+    The stream ID 0 is reserved for the heartbeat, and `CONTROL_RID` for the one-way events;
+    the first frame of a stream is tagged with `OPEN_FLAG`, and the frames of unknown streams are dropped.
+    `alive` records when the last bytes were moved from or to the peer.
+
+    Args:
+        sock (socket.socket): The connected stream socket.
+        name (str): The peer name used in the error messages.
+        on_open (callable): (Optional) Called with the new `Stream` when the peer opens one.
+        on_event (callable): (Optional) Called with the decoded event when the peer sends one.
+    """
+    def __init__(self, sock:socket.socket, name:str='', on_open=None, on_event=None):
+        self.sock, self.name, self.on_open = sock, name, on_open
+        self.on_event = on_event
+        self.lock = threading.Lock()
+        self.streams = dict()
+        self.rid = itertools.count(1)
+        self.closed = False
+        self.alive = time.monotonic()
+        pass
+
+    def open(self) -> Stream:
+        if self.closed:
+            raise ClientConnectionLossException(f'{self.name} disconnected.')
+        stream = Stream(self, next(self.rid))
+        self.streams[stream.rid] = stream
+        return stream
+
+    def _progress(self):
+        ## any bytes moved in either direction prove the peer alive, e.g., in a long transfer
+        self.alive = time.monotonic()
+        pass
+
+    def send(self, rid:int, msg):
+        with self.lock:
+            _send(self.sock, _encode(msg), rid, self._progress)
+        pass
+
+    def sendfile(self, rid:int, fd, offset:int, count:int):
+        '''Send the file range as one frame, with the payload copied in kernel by `sendfile`.'''
+        with self.lock:
+            _sendall(self.sock, [ FRAME_HEADER.pack(count+4, rid) ], self._progress)
+            sent = 0
+            while sent < count:
+                _len = os.sendfile(self.sock.fileno(), fd.fileno(), offset+sent, min(count-sent, SEND_QUANTUM))
+                if not _len: break
+                sent += _len
+                self._progress()
+            if sent != count:
+                self.sock.close() #the frame is broken
+                raise FileIntegrityException(f'{fd.name} truncated while sending.')
+        pass
+
+    def ping(self):
+        ## skip when a frame is being sent, whose progress is counted as liveness instead
+        if self.lock.acquire(blocking=False):
+            try:
+                _send(self.sock, b'ping', 0)
+            finally:
+                self.lock.release()
+        pass
+
+    def close(self):
+        self.closed = True
+        for stream in list(self.streams.values()):
+            stream.inbox.put(None)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR) #wake up the blocking `service`
+        except OSError:
+            pass
+        self.sock.close()
+        pass
+
+    def service(self):
+        try:
+            while True:
+                rid, _msg = _recv_tagged(self.sock, self._progress)
+                if rid==0:
+                    if _msg==b'ping': self.send(0, b'pong')
+                elif rid==CONTROL_RID:
+                    try:
+                        if self.on_event: self.on_event( _decode(_msg) )
+                    except Exception as e: #a bad event never stops the channel
+                        print(f'{time.ctime()}: Event from "{self.name}" dropped: {type(e).__name__}: {e}.')
+                elif rid & OPEN_FLAG:
+                    if not self.on_open: continue
+                    stream = Stream(self, rid & ~OPEN_FLAG, opened=True)
+                    self.streams[stream.rid] = stream
+                    stream.inbox.put(_msg)
+                    self.on_open(stream)
+                elif rid in self.streams:
+                    self.streams[rid].inbox.put(_msg)
+                ## else: the late frames of a closed stream are dropped
+        except (struct.error, OSError):
+            pass
+        finally:
+            self.close()
+        pass
+    pass
+
+def _blocking(msg:dict) -> bool:
+    """Whether the request may block until the tasks complete, which is then served outside the worker pools."""
+    if not isinstance(msg, dict): return False
+    request, args = msg.get('request'), msg.get('args') or dict()
+    if request in ['fetch', 'batch_fetch']:
+        return bool( args.get('block') )
+    if request in ['wait', 'batch_wait']:
+        return args.get('timeout', 0)!=0
+    return False
+
+def _spawn(func, *args) -> Future:
+    """Run the function in a dedicated (unbounded) daemon thread, with the result in a future."""
+    future = Future()
+    def _run():
+        try:
+            future.set_result( func(*args) )
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=_run, daemon=True).start()
+    return future
+
+def _sync(stream:Stream, msg):
+    stream.send(msg)
+    _msg = _decode( stream.recv() )
     return _msg
 
-def _send_file(sock:socket.socket, name:str, file_glob:str) -> None:
+@lru_cache(maxsize=4096)
+def _digest(path:str, _size:int, _mtime_ns:int):
+    '''Return the sha256 digest and the per-block sha1 digests of the file, cached by its size and mtime.'''
+    file_hash, block_hashes = hashlib.sha256(), list()
+    with open(path, 'rb') as fd:
+        while True:
+            _block = fd.read(BLOCK_SIZE)
+            if not _block: break
+            file_hash.update(_block)
+            block_hashes.append( hashlib.sha1(_block).hexdigest() )
+    return file_hash.hexdigest(), tuple(block_hashes)
+
+def _file_digest(path:Path):
+    _stat = path.stat()
+    return (_stat.st_size, *_digest(str(path), _stat.st_size, _stat.st_mtime_ns))
+
+def _list_files(file_glob:str, blocks:bool=False) -> dict:
+    '''Return the digests of the local files matching the glob, relative to the working directory.'''
+    files = dict()
+    for _file in filter(lambda x:x.is_file(), Path('.').glob(file_glob)):
+        size, file_hash, block_hashes = _file_digest(_file)
+        files[ _file.as_posix() ] = { 'size':size, 'sha256':file_hash,
+                                      'blocks':list(block_hashes) if blocks else None }
+    return files
+
+def _parse_codebase(codebase:dict, basename:str) -> dict:
+    '''Return the codebase entry as `{glob, compress, level}`, where the entry is a glob or a dict.'''
+    if basename not in codebase:
+        raise CodebaseNonExistException(basename)
+    entry = codebase[basename]
+    entry = entry if isinstance(entry, dict) else {'glob':entry}
+    return { 'glob':entry['glob'], 'compress':entry.get('compress','none'), 'level':entry.get('level') }
+
+def _choose_compress(fd, compress:str, level, supported:list):
+    '''Choose the compression of one file, skipping it when the sample is incompressible.'''
+    if compress=='auto': compress = 'zlib'
+    if compress not in COMPRESSORS or compress not in supported:
+        return None
+    ##
+    _sample = fd.read(SAMPLE_SIZE); fd.seek(0)
+    if len(_sample) < 512 or len(zlib.compress(_sample, 1)) > 0.9*len(_sample):
+        return None
+    return compress
+
+class SharedFiles:
+    """The files read once (memory-mapped) and shared by the concurrent senders of one fan-out sync.
+    The compressed chunks are kept in a LRU cache bounded by `max_bytes`, as the senders progress roughly together.
+    """
+    def __init__(self, max_bytes:int=SHARED_CACHE_BYTES):
+        self.lock = threading.Lock()
+        self.files, self.chunks = dict(), OrderedDict()
+        self.nbytes, self.max_bytes = 0, max_bytes
+        pass
+
+    def view(self, path:Path) -> memoryview:
+        with self.lock:
+            if path not in self.files:
+                with open(path, 'rb') as fd:
+                    _empty = os.fstat(fd.fileno()).st_size==0
+                    self.files[path] = b'' if _empty else mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview( self.files[path] )
+
+    def compressed(self, path:Path, offset:int, count:int, compress:str, level) -> bytes:
+        key = (path, offset, count, compress)
+        with self.lock:
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+                return self.chunks[key]
+        _chunk = COMPRESSORS[compress][0]( self.view(path)[offset:offset+count], level )
+        with self.lock:
+            if key not in self.chunks:
+                self.chunks[key] = _chunk
+                self.nbytes += len(_chunk)
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= len( self.chunks.popitem(last=False)[1] )
+        return _chunk
+
+    def close(self):
+        self.chunks.clear()
+        self.nbytes = 0
+        for _file in self.files.values():
+            try:
+                if isinstance(_file, mmap.mmap): _file.close()
+            except BufferError:
+                pass #still exported, released on gc
+        pass
+    pass
+
+def _send_file(sock:Stream, name:str, file_glob:str, remote:dict={},
+               compress:str='none', level=None, supported:list=[], shared=None) -> dict:
     file_list = Path(__file__).parent.resolve().glob(file_glob)
     file_list = filter(lambda x:x.is_file(), file_list)
+    summary = { 'files_sent':0, 'files_skipped':0, 'files_compressed':0,
+                'bytes_sent':0, 'bytes_saved':0, 'bytes_wire':0 }
+    _start = time.time()
     ##
     for _file in file_list:
         file_name = _file.relative_to( Path('.').resolve() ).as_posix()
+        file_len, file_hash, block_hashes = _file_digest(_file)
+        ## skip identical file, or send the changed blocks only
+        _remote = remote.get(file_name)
+        if _remote and _remote['sha256']==file_hash:
+            summary['files_skipped'] += 1
+            summary['bytes_saved'] += file_len
+            continue
+        if _remote and _remote['blocks'] is not None:
+            blocks = [ i for i,x in enumerate(block_hashes)
+                        if i>=len(_remote['blocks']) or _remote['blocks'][i]!=x ]
+            ranges = [ (i*BLOCK_SIZE, min(BLOCK_SIZE, file_len-i*BLOCK_SIZE)) for i in blocks ]
+        else:
+            blocks = None
+            ranges = [ (i, min(CHUNK_SIZE, file_len-i)) for i in range(0, file_len, CHUNK_SIZE) ]
+        ##
         print(f'Send to {name}: "{file_name}" ... ', end='', flush=True)
         with open(_file, 'rb') as fd:
-            fd.seek(0, os.SEEK_END)
-            file_len = fd.tell()
-            fd.seek(0, 0)
-            trunk_num = file_len // CHUNK_SIZE
-            ## (1) send file name
-            _send(sock, file_name)
-            ## (2) send chunks
-            for i in range(trunk_num):
-                _send(sock, fd.read(CHUNK_SIZE))
-            ## (3) send remains
-            _send(sock, fd.read())
-            _send(sock, '@end') #finalize file sending
+            _compress = _choose_compress(fd, compress, level, supported)
+            ## (1) send file header
+            sock.send({ 'name':file_name, 'size':file_len, 'sha256':file_hash, 'blocks':blocks,
+                        'mode':_file.stat().st_mode & 0o777, 'compress':_compress })
+            ## (2) send chunks, or the changed blocks
+            _wire = 0
+            for offset,count in ranges:
+                if _compress and shared:
+                    _chunk = shared.compressed(_file, offset, count, _compress, level)
+                elif _compress:
+                    fd.seek(offset)
+                    _chunk = COMPRESSORS[_compress][0]( fd.read(count), level )
+                else: #uncompressed, copied in kernel even when shared
+                    _chunk = None
+                    sock.sendfile(fd, offset, count)
+                if _chunk is not None: sock.send(_chunk)
+                _wire += count if _chunk is None else len(_chunk)
+        _sent = sum( x[1] for x in ranges )
+        summary['files_sent'] += 1
+        summary['files_compressed'] += 1 if _compress else 0
+        summary['bytes_sent'] += _sent
+        summary['bytes_saved'] += file_len - _sent
+        summary['bytes_wire'] += _wire
         print('done.')
-    _send(sock, '') #finalize sending
+    sock.send('') #finalize sending
+    ##
+    _duration = time.time() - _start
+    summary['ratio'] = summary['bytes_wire'] / summary['bytes_sent'] if summary['bytes_sent'] else 1.0
+    summary['throughput'] = summary['bytes_sent'] / _duration / 1E6 if _duration else 0.0 #MB/s
+    return summary
+
+def _recv_file(sock:Stream, file_glob:str, timeout:float=SYNC_TIMEOUT) -> None:
+    while True:
+        ## (1) recv file header
+        _header = sock.recv(timeout)
+        if not _header: break
+        header = _decode(_header)
+        file_name, file_len, blocks = header['name'], header['size'], header['blocks']
+        _decompress = COMPRESSORS[ header['compress'] ][1] if header['compress'] else None
+        if blocks is None:
+            ranges = [ (i, min(CHUNK_SIZE, file_len-i)) for i in range(0, file_len, CHUNK_SIZE) ]
+        else:
+            ranges = [ (i*BLOCK_SIZE, min(BLOCK_SIZE, file_len-i*BLOCK_SIZE)) for i in blocks ]
+        ##
+        if not Path(file_name).match(file_glob):
+            [ sock.recv(timeout) for _ in ranges ]
+            print(f'"{file_name}" rejected.')
+            continue
+        ## (2) recv chunks into the temporary file next to the destination
+        _path = Path(file_name)
+        _path.parent.mkdir(parents=True, exist_ok=True)
+        _fd, _tmp = tempfile.mkstemp(dir=_path.parent, prefix=f'.{_path.name}.')
+        try:
+            with open(_fd, 'wb') as fd:
+                if blocks is not None and _path.is_file():
+                    with open(_path, 'rb') as _old:
+                        shutil.copyfileobj(_old, fd)
+                for offset,count in ranges:
+                    _chunk = sock.recv(timeout)
+                    if _decompress: _chunk = _decompress(_chunk)
+                    if len(_chunk)!=count:
+                        raise FileIntegrityException(f'"{file_name}" chunk at {offset} broken.')
+                    fd.seek(offset)
+                    fd.write(_chunk)
+                fd.truncate(file_len)
+            ## (3) verify and replace atomically
+            _size, _hash, _ = _file_digest( Path(_tmp) )
+            if _size!=file_len or _hash!=header['sha256']:
+                raise FileIntegrityException(f'"{file_name}" verification failed.')
+            os.chmod(_tmp, header['mode'])
+            os.replace(_tmp, _path)
+        except:
+            os.unlink(_tmp)
+            raise
+        print(f'"{file_name}" received.')
     pass
 
-def _recv_file(sock:socket.socket, file_glob:str) -> None:
-    try:
-        sock.settimeout(1.0)
+class OutputBuffer:
+    """Bounded ring buffer of one output stream, addressed by the absolute byte offset."""
+    __slots__ = ['data', 'start', 'limit', 'lock']
+    def __init__(self, limit:int=OUTPUT_LIMIT):
+        self.data, self.start, self.limit = bytearray(), 0, limit
+        self.lock = threading.Lock()
+        pass
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.data)
+
+    def write(self, chunk:bytes):
+        with self.lock:
+            self.data += chunk
+            overflow = len(self.data) - self.limit
+            if overflow > 0:
+                del self.data[:overflow]
+                self.start += overflow
+        pass
+
+    def read(self, since:int=0):
+        with self.lock:
+            since = min(max(since, self.start), self.end)
+            return bytes(self.data[since-self.start:]), self.end
+
+    def read_text(self, since:int=0, final:bool=False):
+        """Read the text since the byte offset, trimmed to the UTF-8 character boundaries.
+
+        The incomplete trailing character is left for the next read (unless `final`),
+        and the returned offset is the end of the trimmed data.
+        """
+        with self.lock:
+            since = min(max(since, self.start), self.end)
+            data = memoryview(self.data)[since-self.start:]
+            ## skip the continuation bytes of a character truncated by the ring buffer
+            head = 0
+            while head < min(3, len(data)) and since==self.start>0 and data[head] & 0xC0 == 0x80:
+                head += 1
+            ## leave out the incomplete trailing character
+            tail = len(data)
+            if not final:
+                for i in range(1, min(4, len(data)-head) + 1):
+                    _byte = data[-i]
+                    if _byte & 0xC0 != 0x80:
+                        _width = 2 if _byte>>5==0b110 else 3 if _byte>>4==0b1110 else 4 if _byte>>3==0b11110 else 1
+                        if _width > i: tail -= i
+                        break
+            text = bytes(data[head:tail]).decode(errors='replace')
+            data.release()
+            return text, since + tail
+
+    def getvalue(self) -> bytes:
+        with self.lock:
+            return bytes(self.data)
+    pass
+
+class SupervisedJob:
+    __slots__ = ['processes', 'returns', 'expired', 'outputs', 'remains', 'event']
+    def __init__(self, processes:list):
+        self.processes = processes
+        self.returns = [None] * len(processes)
+        self.expired = [False] * len(processes)
+        self.outputs = [ (OutputBuffer(), OutputBuffer()) for _ in processes ]
+        self.remains = len(processes)
+        self.event = threading.Event()
+        if not self.remains: self.event.set()
+        pass
+
+    def wait(self, timeout=None) -> bool:
+        return self.event.wait(timeout)
+
+    def stdout(self, i:int) -> str:
+        return self.outputs[i][0].getvalue().decode(errors='replace')
+
+    def stderr(self, i:int) -> str:
+        return self.outputs[i][1].getvalue().decode(errors='replace')
+    pass
+
+class ProcessSupervisor:
+    """The shared child process supervisor of one daemon.
+
+    All the child exits are waited on one selector via `pidfd` (or coarse polling if not supported),
+    and the timeouts are enforced with a timer heap, so no thread is spinning for in-flight tasks.
+    The stdout/stderr pipes are drained on the same selector into the job's bounded output buffers.
+    The supervisor thread is started on `start` (or the first spawn), i.e., in the daemon process.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending, self.polling, self.timers = list(), list(), list()
+        self.counter = itertools.count()
+        self.thread = None
+        pass
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None: return
+            self.selector = selectors.DefaultSelector()
+            self._rfd, self._wfd = os.pipe()
+            os.set_blocking(self._rfd, False); os.set_blocking(self._wfd, False)
+            self.selector.register(self._rfd, selectors.EVENT_READ, None)
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        pass
+
+    def _wakeup(self):
+        try:
+            os.write(self._wfd, b'\0')
+        except BlockingIOError:
+            pass #already signalled
+        pass
+
+    def spawn(self, commands:list, timeout:float) -> SupervisedJob:
+        self.start()
+        processes = list()
+        try:
+            for cmd in commands:
+                processes.append( ARGV_POPEN(cmd) if isinstance(cmd, list) else SHELL_POPEN(cmd) )
+        except OSError:
+            ## not registered yet, so kill and reap the started ones here
+            for proc in processes:
+                if isinstance(proc.args, str):
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                else:
+                    proc.kill()
+                proc.communicate()
+            raise
+        job = SupervisedJob(processes)
+        with self.lock:
+            self.pending.append( (job, time.monotonic()+timeout) )
+        self._wakeup()
+        return job
+
+    def _register(self, job:SupervisedJob, deadline:float):
+        for i,proc in enumerate(job.processes):
+            for k,pipe in enumerate([proc.stdout, proc.stderr]):
+                os.set_blocking(pipe.fileno(), False)
+                self.selector.register(pipe, selectors.EVENT_READ, ('pipe', job, i, k))
+            try:
+                fd = os.pidfd_open(proc.pid)
+            except (AttributeError, OSError):
+                self.polling.append( (job, i) )
+            else:
+                self.selector.register(fd, selectors.EVENT_READ, ('exit', job, i))
+        if job.remains:
+            heapq.heappush(self.timers, (deadline, next(self.counter), job))
+        pass
+
+    def _drain(self, job:SupervisedJob, i:int, k:int, close=False):
+        pipe = [job.processes[i].stdout, job.processes[i].stderr][k]
+        if pipe.closed: return
         while True:
-            with NamedTemporaryFile() as fd:
-                ## (1) recv file name
-                file_name = _recv(sock).decode()
-                if not file_name: break
-                ## (2) recv chunks until end
-                while True:
-                    _chunk = _recv(sock)
-                    if _chunk==b'@end': break
-                    fd.write(_chunk)
-                fd.flush()
-                ## (3) copy to codebase
-                if Path(file_name).match(file_glob):
-                    Path(file_name).parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copyfile(fd.name, file_name)
-                    print(f'"{file_name}" received.')
+            try:
+                chunk = os.read(pipe.fileno(), 65536)
+            except BlockingIOError:
+                chunk = None
+            if chunk: job.outputs[i][k].write(chunk)
+            if not chunk: break
+        if chunk==b'' or close:
+            self.selector.unregister(pipe)
+            pipe.close()
+        pass
+
+    def _reap(self, job:SupervisedJob, i:int):
+        ## collect the remaining outputs, neglecting the ones of detached grandchildren
+        self._drain(job, i, 0, close=True)
+        self._drain(job, i, 1, close=True)
+        job.returns[i] = job.processes[i].wait()
+        job.remains -= 1
+        if job.remains==0: job.event.set()
+        pass
+
+    def _expire(self, job:SupervisedJob):
+        for i,proc in enumerate(job.processes):
+            if job.returns[i] is None:
+                job.expired[i] = True
+                if isinstance(proc.args, str): #kill the shell with the process group
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
                 else:
-                    print(f'"{file_name}" rejected.')
-    except Exception as e:
-        sock.settimeout(None)
-        raise e
+                    proc.kill()
+        pass
+
+    def run(self):
+        while True:
+            with self.lock:
+                pending, self.pending = self.pending, list()
+            for job,deadline in pending:
+                self._register(job, deadline)
+            ## block until next exit, timer or registration
+            timeout = max(0, self.timers[0][0] - time.monotonic()) if self.timers else None
+            if self.polling:
+                timeout = min(timeout, POLL_INTERVAL) if timeout is not None else POLL_INTERVAL
+            for key,_ in self.selector.select(timeout):
+                if key.data is None:
+                    while True:
+                        try:
+                            if not os.read(self._rfd, BUFFER_SIZE): break
+                        except BlockingIOError:
+                            break
+                elif key.data[0]=='pipe':
+                    self._drain(*key.data[1:])
+                elif key.data[0]=='exit':
+                    self.selector.unregister(key.fd)
+                    os.close(key.fd)
+                    self._reap(*key.data[1:])
+            ## fallback for platforms without `pidfd`
+            for job,i in list(self.polling):
+                if job.processes[i].poll() is not None:
+                    self.polling.remove( (job,i) )
+                    self._reap(job, i)
+            ## expire timers
+            _now = time.monotonic()
+            while self.timers and self.timers[0][0] <= _now:
+                _, _, job = heapq.heappop(self.timers)
+                if not job.event.is_set(): self._expire(job)
+        pass
+
     pass
 
-def _extract(cmd:str, format:str):
+class TaskPool:
+    """The bounded task pool of one daemon.
+
+    The completed tasks beyond `max_entries` or `max_bytes` are spilled to a temporary on-disk store (oldest first);
+    the spilled tasks are read back as read-only copies and never re-enter the memory.
+    The tasks are dropped `ttl` seconds after their first fetch.
+    The running tasks and the unfetched results are never dropped.
+    """
+    def __init__(self, max_entries:int=TASK_MAX_ENTRIES, max_bytes:int=TASK_MAX_BYTES, ttl:float=TASK_TTL):
+        self.max_entries, self.max_bytes, self.ttl = max_entries, max_bytes, ttl
+        self.lock = threading.RLock()
+        self.tasks, self.sizes = dict(), dict()
+        self.completed = OrderedDict() #spill candidates, in completion order
+        self.expiry = OrderedDict()    #fetched tasks, in fetch order
+        self.nbytes = 0
+        self.store = None
+        pass
+
+    def _open_store(self) -> sqlite3.Connection:
+        if self.store is None:
+            ## a private temporary database, whose file is removed by SQLite itself, even on a killed daemon
+            self.store = sqlite3.connect('', check_same_thread=False, isolation_level=None)
+            self.store.execute('CREATE TABLE IF NOT EXISTS tasks (tid TEXT PRIMARY KEY, results BLOB, fetched REAL)')
+            self.store.execute('CREATE INDEX IF NOT EXISTS tasks_fetched ON tasks (fetched)')
+        return self.store
+
+    def _load(self, tid:str):
+        if self.store is None:
+            return None
+        row = self.store.execute('SELECT results, fetched FROM tasks WHERE tid=?', (tid,)).fetchone()
+        if row is None:
+            return None
+        task = { 'results':json.loads( zlib.decompress(row[0]) ) }
+        if row[1] is not None: task['fetched'] = row[1]
+        return task
+
+    def __setitem__(self, tid:str, task:dict):
+        with self.lock:
+            self.tasks[tid] = task
+            self._enforce()
+        pass
+
+    def __contains__(self, tid:str) -> bool:
+        with self.lock:
+            if tid in self.tasks:
+                return True
+            return self.store is not None and \
+                self.store.execute('SELECT 1 FROM tasks WHERE tid=?', (tid,)).fetchone() is not None
+
+    def __getitem__(self, tid:str) -> dict:
+        with self.lock:
+            if tid in self.tasks:
+                return self.tasks[tid]
+            task = self._load(tid) #read-only copy of the spilled task
+            if task is None:
+                raise KeyError(f'tid={tid} not exists.')
+            return task
+
+    def _account(self, tid:str):
+        task = self.tasks[tid]
+        size = len( json.dumps(task['results']) )
+        if 'job' in task:
+            size += sum( len(x.data) for pair in task['job'].outputs for x in pair )
+        self.nbytes += size - self.sizes.get(tid, 0)
+        self.sizes[tid] = size
+        pass
+
+    def complete(self, tid:str):
+        with self.lock:
+            self._account(tid)
+            self.completed[tid] = None
+            self._enforce()
+        pass
+
+    def fetched(self, tid:str):
+        with self.lock:
+            if tid in self.tasks:
+                if 'fetched' not in self.tasks[tid]:
+                    self.tasks[tid]['fetched'] = time.time()
+                    self.expiry[tid] = self.tasks[tid]['fetched']
+            elif self.store is not None:
+                self.store.execute('UPDATE tasks SET fetched=? WHERE tid=? AND fetched IS NULL', (time.time(), tid))
+            self._enforce()
+        pass
+
+    def _drop(self, tid:str):
+        self.tasks.pop(tid)
+        self.nbytes -= self.sizes.pop(tid, 0)
+        self.completed.pop(tid, None)
+        self.expiry.pop(tid, None)
+        pass
+
+    def _enforce(self):
+        _deadline = time.time() - self.ttl
+        ## (1) drop the fetched tasks after ttl, oldest first
+        while self.expiry and next(iter(self.expiry.values())) < _deadline:
+            self._drop( next(iter(self.expiry)) )
+        if self.store is not None:
+            self.store.execute('DELETE FROM tasks WHERE fetched < ?', (_deadline,))
+        ## (2) spill the oldest completed tasks beyond the limits
+        while self.completed and (len(self.tasks) > self.max_entries or self.nbytes > self.max_bytes):
+            tid = next(iter(self.completed))
+            task = self.tasks[tid]
+            _blob = zlib.compress( json.dumps(task['results']).encode() )
+            self._open_store().execute('INSERT OR REPLACE INTO tasks VALUES (?,?,?)',
+                                       (tid, _blob, task.get('fetched')))
+            self._drop(tid)
+        pass
+
+    pass
+
+class ResultStore:
+    """The persistent store of the completed tasks on master, indexed by client, function and time."""
+    def __init__(self, path:str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (tid TEXT, client TEXT, function TEXT,
+                            parameters TEXT, started REAL, ended REAL, outputs TEXT)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_client ON results (client, started)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_function ON results (function, started)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_started ON results (started)')
+        pass
+
+    def record(self, client:str, event:dict):
+        ## never raise into the caller, i.e., the task thread or the channel reader
+        try:
+            row = ( event['tid'], client, event['function'], json.dumps(event['parameters']),
+                    event['started'], event['ended'], json.dumps(event['outputs']) )
+            with self.lock:
+                self.db.execute('INSERT INTO results VALUES (?,?,?,?,?,?,?)', row)
+        except Exception as e:
+            print(f'{time.ctime()}: Result of "{client}" not recorded: {type(e).__name__}: {e}.')
+        pass
+
+    def query(self, client:str=None, function:str=None, since:float=None, until:float=None,
+              outputs:list=None, limit:int=-1) -> list:
+        conds, params = list(), list()
+        for cond,value in [('client=?',client), ('function=?',function), ('started>=?',since), ('started<?',until)]:
+            if value is not None:
+                conds.append(cond); params.append(value)
+        sql = 'SELECT tid, client, function, parameters, started, ended, outputs FROM results'
+        sql += (' WHERE ' + ' AND '.join(conds)) if conds else ''
+        sql += ' ORDER BY started'
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        ##
+        results = list()
+        for (tid, client, function, parameters, started, ended, _outputs) in rows:
+            _outputs = json.loads(_outputs)
+            if outputs: #only the runs with the selected outputs
+                _outputs = { k:_outputs[k] for k in outputs if k in _outputs }
+                if not _outputs: continue
+            results.append({ 'tid':tid, 'client':client, 'function':function, 'parameters':json.loads(parameters),
+                             'started':started, 'ended':ended, 'outputs':_outputs })
+            if len(results)==limit: break
+        return results
+    pass
+
+class TaskExecutor:
+    """The admission control of function executions on one daemon.
+
+    At most `max_workers` tasks run at once, and at most `concurrency` tasks of one function if specified
+    in its manifest; the excess tasks wait in a priority queue (FIFO within the same priority).
+    The tasks scheduled with `start_at` are held on a timer heap, and admitted `SCHEDULE_LEAD` seconds ahead.
+    """
+    def __init__(self, handler, max_workers:int=EXEC_WORKERS):
+        self.handler, self.max_workers = handler, max_workers
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.queue, self.scheduled, self.running = list(), list(), dict()
+        self.counter = itertools.count()
+        self.pool, self.timer = None, None
+        pass
+
+    def start(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+                self.timer = threading.Thread(target=self._admit, daemon=True)
+                self.timer.start()
+        pass
+
+    def submit(self, tid:str, fn:str, func, params:dict, timeout:float, priority:int=0, start_at:float=None):
+        self.start()
+        item = (-priority, next(self.counter), tid, fn, func, params, timeout, start_at)
+        with self.lock:
+            if start_at and start_at - SCHEDULE_LEAD > time.time():
+                self.handler.task_pool[tid]['state'] = 'scheduled'
+                heapq.heappush(self.scheduled, (start_at - SCHEDULE_LEAD, item))
+                self.wakeup.notify()
+                return
+            heapq.heappush(self.queue, item)
+        self._schedule()
+        pass
+
+    def _admit(self):
+        ## move the due scheduled tasks to the queue, without holding a worker until then
+        while True:
+            with self.lock:
+                while not self.scheduled or self.scheduled[0][0] > time.time():
+                    self.wakeup.wait( self.scheduled[0][0] - time.time() if self.scheduled else None )
+                while self.scheduled and self.scheduled[0][0] <= time.time():
+                    item = heapq.heappop(self.scheduled)[1]
+                    self.handler.task_pool[ item[2] ]['state'] = 'queued'
+                    heapq.heappush(self.queue, item)
+            self._schedule()
+        pass
+
+    def position(self, tid:str) -> int:
+        with self.lock:
+            for i,item in enumerate( sorted(self.queue) ):
+                if item[2]==tid: return i
+        return -1
+
+    def _schedule(self):
+        started, skipped = list(), list()
+        with self.lock:
+            while self.queue and sum(self.running.values()) < self.max_workers:
+                item = heapq.heappop(self.queue)
+                fn, limit = item[3], item[4].concurrency
+                if limit and self.running.get(fn, 0) >= limit:
+                    skipped.append(item)
+                    continue
+                self.running[fn] = self.running.get(fn, 0) + 1
+                started.append(item)
+            for item in skipped:
+                heapq.heappush(self.queue, item)
+        for item in started:
+            self.pool.submit(self._run, *item[2:])
+        pass
+
+    def _run(self, tid:str, fn:str, func, params:dict, timeout:float, start_at:float):
+        self.handler.task_pool[tid]['state'] = 'running'
+        try:
+            _execute(self.handler, tid, fn, func, params, timeout, start_at)
+        finally:
+            with self.lock:
+                self.running[fn] -= 1
+            self._schedule()
+        pass
+
+    pass
+
+CONVERTERS = { 'str':str, 'int':int, 'float':float }
+TOKEN = re.compile('\\$([A-Za-z_]\\w*)')
+
+def _match(text:str, pattern:re.Pattern, _type:str=None):
+    _convert = CONVERTERS[_type or 'str']
+    if pattern.groupindex: #named groups: the first match as a dict
+        m = pattern.search(text)
+        return { k:_convert(v) for k,v in m.groupdict().items() if v } if m else ''
+    ret = [ x for x in pattern.findall(text) if x ]
+    if len(ret)==0: return ''
+    if not _type: return str(ret[0]) if len(ret)==1 else ret
+    ret = [ tuple(map(_convert,x)) if isinstance(x,tuple) else _convert(x) for x in ret ]
+    return ret[0] if len(ret)==1 else ret
+
+def _extract(cmd:str, pattern:re.Pattern, _type:str=None):
     try:
         ret = SHELL_RUN(cmd).stdout.decode()
     except sp.CalledProcessError as e:
         raise StdErrException( e.stderr.decode() )
-    else:
-        ret = re.findall(format, ret)
-        ret = [ x for x in ret if x ]
-        if len(ret)==0: ret=''
-        if len(ret)==1: ret=str(ret[0])
-    return ret
+    return _match(ret, pattern, _type)
+
+class Template:
+    """A string tokenised on its `$name` placeholders; unknown names are kept as-is."""
+    def __init__(self, text:str):
+        self.parts = TOKEN.split(text) #[literal, name, literal, ..., literal]
+        pass
+
+    def bind(self, values:dict) -> str:
+        parts = self.parts.copy()
+        for i in range(1, len(parts), 2):
+            parts[i] = str(values[parts[i]]) if parts[i] in values else '$'+parts[i]
+        return ''.join(parts)
+    pass
+
+class FunctionTemplate:
+    """A manifest function compiled once: tokenised commands, compiled output patterns and defaults."""
+    def __init__(self, config:dict):
+        self.config = config
+        self.defaults = config.get('parameters', {})
+        self.concurrency = config.get('concurrency', 0)
+        self.commands = [ [Template(x) for x in cmd] if isinstance(cmd, list) else Template(cmd)
+                          for cmd in config.get('commands', []) ]
+        self.outputs = dict()
+        for key,value in config.get('outputs', {}).items():
+            cmd = Template(value['cmd']) if 'cmd' in value else None
+            self.outputs[key] = (cmd, re.compile(value['format']), value)
+        pass
+
+    def bind(self, params:dict) -> tuple:
+        values = { **self.defaults, **params }
+        commands = [ [x.bind(values) for x in cmd] if isinstance(cmd, list) else cmd.bind(values)
+                     for cmd in self.commands ]
+        return commands, values
+    pass
+
+@lru_cache(maxsize=256)
+def _compile_function(spec:str) -> FunctionTemplate:
+    return FunctionTemplate( json.loads(spec) )
 
-def _execute(name, task_pool, tid, config, params, timeout) -> None:
+def _compile_manifest(manifest:dict) -> tuple:
+    """Return the manifest content hash, and the function templates cached by their content."""
+    version = hashlib.sha256( json.dumps(manifest, sort_keys=True).encode() ).hexdigest()[:16]
+    functions = { k:_compile_function(json.dumps(v))
+                  for k,v in manifest.get('functions', {}).items() }
+    return version, functions
+
+def _stat_of(path:Path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _execute(handler, tid, fn, func:FunctionTemplate, params, timeout, start_at=None) -> None:
+    name, task_pool = handler.name, handler.task_pool
+    exec_params, started = params, time.time()
     try:
         timeout = timeout if timeout>=0 else 999
-        exec_params = config['parameters'] if 'parameters' in config else {}
-        exec_params.update(params)
-        ##
-        commands = config['commands'].copy() if 'commands' in config else []
-        for i in range(len(commands)):
-            for k,v in exec_params.items():
-                commands[i] = commands[i].replace(f'${k}', str(v))
-        ##
-        processes = [ SHELL_POPEN(cmd) for cmd in commands ]
-        returns = [ proc.poll() for proc in processes ]
-        _now = time.time()
-        while None in returns and time.time() - _now < timeout:
-            returns = [ proc.poll() for proc in processes ]
-            time.sleep(0.001)
+        commands, exec_params = func.bind(params)
+        ## hold the spawn until the scheduled start on local clock
+        if start_at:
+            time.sleep( max(0, start_at - time.time()) )
+            start_error = time.time() - start_at
+        started = time.time()
+        job = handler.supervisor.spawn(commands, timeout)
+        task_pool[tid]['job'] = job
+        job.wait()
         ##
         err = list()
-        for i,ret in enumerate(returns):
-            if ret is None:
-                processes[i].kill()
-                processes[i].communicate()
+        for i,ret in enumerate(job.returns):
+            if job.expired[i]:
                 err.append( TimeoutException(f'{name}, [{i}]-th command.') )
-            ##
-            if ret != 0:
-                _stderr = processes[i].stderr; assert(not _stderr==None)
-                err.append( StdErrException(_stderr.read().decode()) )
+            elif ret != 0:
+                err.append( StdErrException(job.stderr(i)) )
         if err: raise err[0] #raise the first error
         ##
-        outputs = dict()
-        for i,p in enumerate(processes):
-            _stdout = p.stdout; assert(not _stdout==None)
-            outputs.update({ f'$output_{i}' : repr(_stdout.read().decode().strip())  })
-        ##
+        values = dict() #built on the first shell-form output
         results = dict()
-        output_items = config['outputs'].items() if 'outputs' in config else dict()
-        for key,value in output_items:
-            cmd, _format = value['cmd'], value['format']
-            for k,o in outputs.items():
-                cmd = cmd.replace(k,o)
-            for k,v in exec_params.items():
-                cmd = cmd.replace(f'${k}', str(v))
-            results[key] = _extract(cmd, _format)
+        for key,(cmd, pattern, value) in func.outputs.items():
+            _type = value.get('type')
+            if cmd is None: #in-process: match on the captured output
+                i, _stream = value.get('source', 0), value.get('stream', 'stdout')
+                text = job.stderr(i) if _stream=='stderr' else job.stdout(i)
+                results[key] = _match(text, pattern, _type)
+                continue
+            if not values:
+                values.update(exec_params)
+                for i in range(len(job.processes)):
+                    values.update({ f'output_{i}' : repr(job.stdout(i).strip())  })
+            cmd = cmd.bind(values)
+            results[key] = _extract(cmd, pattern, _type)
     except Exception as e:
         task_pool[tid]['results'] = { 'err': UntangledException.format('Client', e) }
     else:
+        if start_at: results['__start_error__'] = start_error
         task_pool[tid]['results'] = results
+    task_pool.complete(tid)
+    ended = time.time()
+    ## notify the blocking `fetch` and `wait` requests, ahead of the report
+    with handler.task_cond:
+        handler.task_cond.notify_all()
+    handler._report({ 'tid':tid, 'function':fn, 'parameters':exec_params, 'started':started,
+                      'ended':ended, 'outputs':task_pool[tid]['results'] })
     pass
 
 class Request:
-    def __init__(self, handler):
+    def __init__(self, handler, stream=None):
         self.handler = handler
+        self.stream = stream
 
     def console(self, args, client='') -> dict:
         '''Default console behavior: [console] <--(bypass)--> [server].'''
         ## --> [server]
         _request = type(self).__name__
-        args = {'request':_request, 'args':args}
         client = client if client else self.handler.client
-        req = '{request} {client}@{args}'.format(
-                request=_request, client=client, args=json.dumps(args) ).encode()
-        self.handler.sock.send(req)
+        req = { 'request':_request, 'client':client, 'args':args }
         ## <-- [server]
-        # res = self.handler.sock.recv(BUFFER_SIZE).decode()
-        res = _frag_recv(self.handler.sock).decode()
-        res = json.loads(res)
+        res = self.handler._request( _encode(req) )
+        res = _decode(res)
         if 'err' in res:
             UntangledException(res['err'])
         return res
 
-    def server(self, args:str) -> dict:
+    def server(self, args, client='') -> dict:
         '''Default server behavior: [server] <--(bypass)--> [proxy].'''
         _request = type(self).__name__
-        name, args = args.split('@', maxsplit=1)
+        name = client
         ## handle at server's side
         if name in ['', self.handler.name]:
-            req = { '__server_role__':'server', 'args':json.loads(args)['args'] }
+            req = { '__server_role__':'server', 'args':args }
             return req
         ## else bypass to proxy
         try:
@@ -251,15 +1176,21 @@ class Request:
             e = ClientNotFoundException(f'Client "{name}" not exists.')
             res = { 'err': UntangledException.format('Server', e) }
         else:
-            ## --> [proxy]
-            client['tx'].put((_request, args))
-            ## <-- [proxy]
-            res = client['rx'].get()
+            ## --> [proxy] <--
+            res = self.forward(name, client, _request, args)
+        return res
+
+    def forward(self, name:str, client:dict, request:str, args) -> dict:
+        '''Run the proxy on a dedicated stream of the client channel.'''
+        try:
+            res = self.handler.proxy(name, client, request, args)
+        except Exception as e:
+            res = { 'err': UntangledException.format('Proxy', e) }
         return res
 
-    def proxy(self, conn, _name:str, _task_pool:dict, args:str) -> dict:
+    def proxy(self, conn, _name:str, _task_pool:dict, args) -> dict:
         '''Default proxy behavior: [proxy] <--(bypass)--> [client].'''
-        return _sync(conn, args)
+        return _sync(conn, {'request':type(self).__name__, 'args':args})
 
     @abstractmethod
     def client(self, args:dict) -> dict: pass
@@ -267,9 +1198,43 @@ class Request:
 
 class Handler:
     ## console <--> server <--> proxy <--> client
-    def handle(self, request:str, args, **kwargs) -> dict:
+    def _load(self, manifest:dict):
+        self.version, self.functions = _compile_manifest(manifest)
+        self.manifest = manifest
+        pass
+
+    def _reload(self):
+        path = Path('./manifest.json')
+        self.manifest_stat = _stat_of(path)
+        with open(path) as fh:
+            manifest = json.load(fh)
+        functions = self.functions
+        self._load(manifest)
+        changed = [ k for k,v in self.functions.items() if functions.get(k) is not v ]
+        print(f'{time.ctime()}: Manifest reloaded ({self.version}), changed functions: {changed}.')
+        pass
+
+    def _report(self, event:dict):
+        ## the completion of a task, recorded by the result store of master
+        pass
+
+    def watch_service(self, interval:float):
+        ## reload on the change of manifest file, where the unchanged functions keep their templates
+        path = Path('./manifest.json')
+        self.manifest_stat = _stat_of(path)
+        while True:
+            time.sleep(interval)
+            if _stat_of(path) in [None, self.manifest_stat]:
+                continue
+            try:
+                self._reload()
+            except Exception as e:
+                print(f'{time.ctime()}: Manifest reload failed, {e}.')
+        pass
+
+    def handle(self, request:str, args, stream=None, **kwargs) -> dict:
         try:
-            handler = getattr(Handler, request)(self)
+            handler = getattr(Handler, request)(self, stream)
         except:
             raise InvalidRequestException(f'Request "{request}" is invalid.')
         ##
@@ -281,28 +1246,35 @@ class Handler:
             return handler.console(args, **kwargs)
         return dict()
 
-    def proxy(self, name:str, client:dict, request:str, args:str) -> dict:
+    def proxy(self, name:str, client:dict, request:str, args) -> dict:
         handler = getattr(self, request)(self)
-        conn, task_pool = client['conn'], client['task_pool']
-        return handler.proxy(conn, name, task_pool, args)
+        stream, task_pool = client['channel'].open(), client['task_pool']
+        try:
+            return handler.proxy(stream, name, task_pool, args)
+        finally:
+            stream.close()
 
     class list_all(Request):
-        def server(self, _args):
+        def server(self, _args, client=''):
             return  { k:v['addr'] for k,v in self.handler.client_pool.items() }
         pass
 
     class describe(Request):
-        def server(self, args):
-            req = super().server(args)
+        def server(self, args, client=''):
+            req = super().server(args, client)
             res = self.client(req['args']) if '__server_role__' in req else req
             return res
-        def client(self, _args):
-            return { k:v['description'] for k,v in self.handler.manifest['functions'].items() }
+        def client(self, args):
+            if args.get('version')==self.handler.version:
+                return { '__version__':self.handler.version, '__unchanged__':True }
+            res = { k:v.config['description'] for k,v in self.handler.functions.items() }
+            res['__version__'] = self.handler.version
+            return res
         pass
 
     class reload(Request):
-        def server(self, args):
-            req = super().server(args)
+        def server(self, args, client=''):
+            req = super().server(args, client)
             res = self.client(req['args']) if '__server_role__' in req else req
             return res
         def client(self, _args):
@@ -312,52 +1284,79 @@ class Handler:
     class info(Request):
         def client(self, args):
             function = args['function']
-            return self.handler.manifest['functions'][function]
-        def server(self, args):
-            req = super().server(args)
+            if args.get('version')==self.handler.version:
+                return { '__version__':self.handler.version, '__unchanged__':True }
+            res = dict( self.handler.manifest['functions'][function] )
+            res['__version__'] = self.handler.version
+            return res
+        def server(self, args, client=''):
+            req = super().server(args, client)
             res = self.client(req['args']) if '__server_role__' in req else req
             return res
         pass
 
+    class push_manifest(Request):
+        def server(self, args, client=''):
+            client_pool = self.handler.client_pool
+            names = args['clients'] if args['clients'] else list(client_pool.keys())
+            p_args = { 'manifest': args['manifest'] if args['manifest'] else self.handler.manifest }
+            ##
+            def _push(name):
+                if name not in client_pool:
+                    e = ClientNotFoundException(f'Client "{name}" not exists.')
+                    return { 'err': UntangledException.format('Server', e) }
+                return self.forward(name, client_pool[name], 'push_manifest', p_args)
+            futures = { name:self.handler.proxy_pool.submit(_push, name) for name in names }
+            return { name:future.result() for name,future in futures.items() }
+
+        def client(self, args):
+            manifest = dict( args['manifest'] )
+            manifest['name'] = self.handler.manifest.get('name', '') #keep the local client name
+            ## replace the manifest file atomically, then reload
+            fd, tmp = tempfile.mkstemp(prefix='.manifest-', dir='.')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(manifest, fh, indent=4)
+            os.replace(tmp, './manifest.json')
+            self.handler._reload()
+            return { 'version': self.handler.version }
+        pass
+
     class execute(Request):
-        def server(self, args):
-            req = super().server(args)
+        def server(self, args, client=''):
+            req = super().server(args, client)
             res = self.client(req['args']) if '__server_role__' in req else req
             return res
 
         def client(self, args):
             params, timeout, fn = args['parameters'], args['timeout'], args['function']
-            config = self.handler.manifest['functions'][fn]
+            func = self.handler.functions[fn]
+            try: #the parameters are recorded as JSON along with the results
+                json.dumps(params)
+            except (TypeError, ValueError) as e:
+                raise InvalidRequestException(f'Parameters of "{fn}" not JSON serializable: {e}')
             ##
             tid = GEN_TID()
-            _thread = threading.Thread(target=_execute, args=(self.handler.name, self.handler.task_pool, tid, config, params, timeout))
-            self.handler.task_pool[tid] = { 'handle':_thread }
-            _thread.start()
+            self.handler.task_pool[tid] = { 'state':'queued' }
+            self.handler.executor.submit(tid, fn, func, params, timeout, args.get('priority', 0), args.get('start_at'))
             return { 'tid': tid }
+
+        def proxy(self, conn, name:str, task_pool:dict, args:dict) -> dict:
+            ## convert the scheduled start to the clock of client
+            if args.get('start_at'):
+                client = self.handler.client_pool[name]
+                fresh = time.monotonic() - client.get('clock_at', -CLOCK_MAX_AGE) < CLOCK_MAX_AGE
+                clock = client['clock'] if fresh and 'clock' in client else self.handler.estimate_clock(name)
+                args = dict(args, start_at=args['start_at']+clock['offset'])
+            return super().proxy(conn, name, task_pool, args)
         pass
 
     class batch_execute(Request):
-        def console(self, args:list):
-            ## --> [server]
-            req_args = '##'.join([ f'{x[0]}@{x[1]}' for x in args ])
-            req = f'batch_execute {req_args}'.encode()
-            self.handler.sock.send(req)
-            ## <-- [server]
-            # res = self.handler.sock.recv(BUFFER_SIZE).decode()
-            res = _frag_recv(self.handler.sock).decode()
-            res = json.loads(res)
-            if 'err' in res:
-                UntangledException(res['err'])
-            return res
-
-        def server(self, args: str) -> dict:
+        def server(self, args:list, client='') -> dict:
             _handler = Handler.execute(self.handler)
             results = list()
             ##
-            arguments = [x.split('@') for x in args.split('##')]
-            for (name, args) in arguments:
+            for (name, p_args) in args:
                 if name in ['', self.handler.name]:
-                    p_args = json.loads(args)['args']
                     res = _handler.client(p_args)
                     res.setdefault('err'); res.setdefault('tid') # type: ignore
                 else:
@@ -366,14 +1365,13 @@ class Handler:
                     except Exception as e:
                         res = { 'tid':None, 'err': UntangledException.format('Server', e) }
                     else:
-                        client['tx'].put(('execute', args)) ## --> [proxy]
-                        res = { 'tid':'',   'err':None }
+                        _future = self.handler.proxy_pool.submit(self.forward, name, client, 'execute', p_args) ## --> [proxy]
+                        res = { 'tid':'',   'err':None, 'future':_future }
                 results.append(res)
             ##
-            for i,(name,_) in enumerate(arguments):
+            for i in range(len(results)):
                 if results[i]['tid']=='':
-                    client = self.handler.client_pool[name]
-                    res = client['rx'].get()  ## <-- [proxy]
+                    res = results[i]['future'].result()  ## <-- [proxy]
                     res.setdefault('err'); res.setdefault('tid') # type: ignore
                     results[i] = res
             ##
@@ -383,67 +1381,256 @@ class Handler:
         pass
 
     class fetch(Request):
-        def server(self, args):
-            req = super().server(args)
+        def server(self, args, client=''):
+            req = super().server(args, client)
             res = self.client(req['args']) if '__server_role__' in req else req
             return res
 
         def client(self, args):
             tid = args['tid']
-            if 'results' in self.handler.task_pool[ tid ]:
-                res = self.handler.task_pool[ tid ]['results']
+            if args.get('block'):
+                timeout = args.get('timeout', -1)
+                with self.handler.task_cond:
+                    self.handler.task_cond.wait_for(lambda: 'results' in self.handler.task_pool[tid],
+                                                    timeout if timeout>=0 else None)
+            task = self.handler.task_pool[ tid ]
+            if 'results' in task:
+                res = task['results']
             else:
-                raise NoResponseException(f'"{self.handler.name}", tid={tid}.')
-            self.handler.task_pool[ tid ]['handle'].join()
+                status = Handler.status(self.handler).client(args)
+                raise NoResponseException('"{}", tid={}, state={}, position={}.'.format(
+                                            self.handler.name, tid, status['state'], status['position']))
+            self.handler.task_pool.fetched(tid)
+            return res
+        pass
+
+    class batch_fetch(Request):
+        def server(self, args, client='') -> dict:
+            tid_list, p_args = args['tid_list'], { 'block':args['block'], 'timeout':args['timeout'] }
+            groups = dict()
+            for i,(name,tid) in enumerate(tid_list):
+                if tid: groups.setdefault(name, list()).append(i)
+            ## fan out to the clients concurrently, one request per client
+            def _fetch(name, index):
+                _args = { 'tid_list':[tid_list[i][1] for i in index], **p_args }
+                if name in ['', self.handler.name]:
+                    return self.client(_args)
+                try:
+                    client = self.handler.client_pool[name]
+                except Exception as e:
+                    return { 'err': UntangledException.format('Server', e) }
+                return self.forward(name, client, 'batch_fetch', _args)
+            _submit = _spawn if args['block'] else self.handler.proxy_pool.submit
+            futures = { name:_submit(_fetch, name, index) for name,index in groups.items() }
+            ## collect in the enqueue order, with the per-task errors in place
+            results = [ None ] * len(tid_list)
+            for name,future in futures.items():
+                res = future.result()
+                for k,i in enumerate(groups[name]):
+                    results[i] = res['results'][k] if 'results' in res else { 'err':res['err'] }
+            return { 'results': results }
+
+        def client(self, args):
+            _handler = Handler.fetch(self.handler)
+            results = list()
+            for tid in args['tid_list']:
+                try:
+                    res = _handler.client({ 'tid':tid, 'block':args['block'], 'timeout':args['timeout'] })
+                except Exception as e:
+                    res = { 'err': UntangledException.format('Client', e) }
+                results.append(res)
+            return { 'results': results }
+        pass
+
+    class status(Request):
+        def server(self, args, client=''):
+            req = super().server(args, client)
+            res = self.client(req['args']) if '__server_role__' in req else req
+            return res
+
+        def client(self, args):
+            tid = args['tid']
+            task = self.handler.task_pool[ tid ]
+            state = 'done' if 'results' in task else task['state']
+            position = self.handler.executor.position(tid) if state=='queued' else -1
+            return { 'state':state, 'position':position }
+        pass
+
+    class clock(Request):
+        def server(self, args, client=''):
+            req = super().server(args, client)
+            res = self.client(req['args']) if '__server_role__' in req else req
+            return res
+
+        def client(self, _args):
+            return { 'time': time.time() }
+        pass
+
+    class sync_clock(Request):
+        def server(self, args, client=''):
+            names = args['clients'] if args['clients'] else list(self.handler.client_pool.keys())
+            def _estimate(name):
+                try:
+                    return self.handler.estimate_clock(name)
+                except Exception as e:
+                    return { 'err': UntangledException.format('Server', e) }
+            futures = { name:self.handler.proxy_pool.submit(_estimate, name) for name in names }
+            return { name:future.result() for name,future in futures.items() }
+        pass
+
+    class query(Request):
+        def server(self, args, client=''):
+            if self.handler.store is None:
+                raise InvalidRequestException('Result store is disabled on server.')
+            return { 'results': self.handler.store.query(**args) }
+        pass
+
+    class wait(Request):
+        def server(self, args, client=''):
+            req = super().server(args, client)
+            res = self.client(req['args']) if '__server_role__' in req else req
+            return res
+
+        def client(self, args):
+            tid_list, mode, timeout = args['tid_list'], args['mode'], args['timeout']
+            task_pool = self.handler.task_pool
+            [ task_pool[tid] for tid in tid_list ] #validate tid
+            ##
+            _done = lambda: [ tid for tid in tid_list if 'results' in task_pool[tid] ]
+            _cond = (lambda: len(_done())>0) if mode=='any' else (lambda: len(_done())==len(tid_list))
+            with self.handler.task_cond:
+                self.handler.task_cond.wait_for(_cond, timeout if timeout>=0 else None)
+            return { 'done': _done() }
+        pass
+
+    class batch_wait(Request):
+        def server(self, args, client='') -> dict:
+            tid_list, mode, timeout = args['tid_list'], args['mode'], args['timeout']
+            groups = dict()
+            for (name,tid) in tid_list:
+                groups.setdefault(name, list()).append(tid)
+            ## fan out to the clients concurrently, one `wait` per client
+            def _wait(name, tids):
+                p_args = { 'tid_list':tids, 'mode':mode, 'timeout':timeout }
+                if name in ['', self.handler.name]:
+                    return Handler.wait(self.handler).client(p_args)
+                try:
+                    client = self.handler.client_pool[name]
+                except Exception as e:
+                    return { 'err': UntangledException.format('Server', e) }
+                return self.forward(name, client, 'wait', p_args)
+            _submit = _spawn if timeout!=0 else self.handler.proxy_pool.submit
+            futures = { _submit(_wait, name, tids):name for name,tids in groups.items() }
+            ## return on the first completion for 'any', leaving the other waits to expire on their own
+            done, pending = list(), set(futures)
+            while pending and not (done and mode=='any'):
+                finished, pending = futures_wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    res = future.result()
+                    if 'err' in res: return res
+                    done.extend( (futures[future], tid) for tid in res['done'] )
+            return { 'done': done }
+        pass
+
+    class tail(Request):
+        def server(self, args, client=''):
+            req = super().server(args, client)
+            res = self.client(req['args']) if '__server_role__' in req else req
             return res
+
+        def client(self, args):
+            tid, since = args['tid'], args['since']
+            index, stream = args['index'], args['stream']
+            task = self.handler.task_pool[ tid ]
+            if 'job' not in task: #not started, or spilled
+                return { 'data':'', 'offset':since, 'done':'results' in task }
+            ##
+            job = task['job']
+            _buffer = job.outputs[index][ ['stdout','stderr'].index(stream) ]
+            done = job.event.is_set()
+            data, offset = _buffer.read_text(since, final=done)
+            return { 'data':data, 'offset':offset, 'done':done }
         pass
 
     class sync_code(Request):
-        def proxy(self, conn, name: str, _task_pool: dict, args: str) -> dict:
+        def proxy(self, conn, name: str, _task_pool: dict, args: dict, shared=None) -> dict:
             res = super().proxy(conn, name, _task_pool, args)
             if 'err' in res:
                 return res
             ##
-            p_args = json.loads(args)['args']
-            basename = p_args['basename']
-            codebase = self.handler.manifest['codebase']
-            if basename not in codebase:
-                raise CodebaseNonExistException(basename)
-            ##
-            file_glob = codebase[basename]
-            _send_file(conn, name, file_glob)
-            return {'res':True}
+            entry = _parse_codebase(self.handler.manifest['codebase'], args['basename'])
+            compress = args['compress'] if args.get('compress') else entry['compress']
+            summary = _send_file(conn, name, entry['glob'], res['files'],
+                                 compress, entry['level'], res['compress'], shared)
+            res = _decode( conn.recv() )
+            if 'err' not in res: res.update(summary)
+            return res
 
         def client(self, args: dict) -> dict:
-            basename = args['basename']
-            codebase = self.handler.manifest['codebase']
-            if basename not in codebase:
-                raise CodebaseNonExistException(basename)
-            else:
-                _send(self.handler.sock, {'res':True})
+            entry = _parse_codebase(self.handler.manifest['codebase'], args['basename'])
+            ## report the existing files and the supported compressions, to receive the changed ones only
+            file_glob = entry['glob']
+            self.stream.send({ 'res':True, 'files':_list_files(file_glob, args.get('blocks', False)),
+                               'compress':list(COMPRESSORS) })
             ##
-            file_glob = codebase[basename]
-            _recv_file(self.handler.sock, file_glob)
+            _recv_file(self.stream, file_glob)
             return {'res':True}
         pass
 
+    class sync_code_all(Request):
+        def server(self, args, client=''):
+            client_pool = self.handler.client_pool
+            names = args['clients'] if args['clients'] else list(client_pool.keys())
+            entry = _parse_codebase(self.handler.manifest['codebase'], args['basename'])
+            _handler = Handler.sync_code(self.handler)
+            shared = SharedFiles()
+            ## digest the files once, ahead of the fan-out
+            file_list = Path(__file__).parent.resolve().glob(entry['glob'])
+            [ _file_digest(x) for x in file_list if x.is_file() ]
+            ##
+            def _sync(name):
+                try:
+                    if name not in client_pool:
+                        raise ClientNotFoundException(f'Client "{name}" not exists.')
+                    stream = client_pool[name]['channel'].open()
+                    try:
+                        return _handler.proxy(stream, name, client_pool[name]['task_pool'], args, shared)
+                    finally:
+                        stream.close()
+                except Exception as e:
+                    return { 'err': UntangledException.format('Proxy', e) }
+            futures = { name:self.handler.proxy_pool.submit(_sync, name) for name in names }
+            results = { name:future.result() for name,future in futures.items() }
+            shared.close()
+            return results
+        pass
+
     pass
 
 class SlaveDaemon(Handler):
-    def __init__(self, port:int, manifest:dict, addr='', alt_name=''):
+    def __init__(self, port:int, manifest:dict, addr='', alt_name='',
+                 retention:tuple=(TASK_MAX_ENTRIES, TASK_MAX_BYTES, TASK_TTL), max_tasks:int=EXEC_WORKERS,
+                 watch:float=WATCH_INTERVAL):
         client_name = alt_name if alt_name else manifest['name']
         self.name = client_name if client_name else f'client-{GEN_TID()}'
-        self.manifest = manifest
+        self._load(manifest)
         ##
         self.addr, self.port = addr, port
-        self.task_pool = dict()
+        self.watch = watch
+        self.events, self.channel = False, None
+        self.task_pool = TaskPool(*retention)
+        self.supervisor = ProcessSupervisor()
+        self.task_cond = threading.Condition()
+        self.executor = TaskExecutor(self, max_tasks)
         pass
 
-    def _reload(self):
-        manifest = open('./manifest.json')
-        manifest = json.load( manifest )
-        self.manifest = manifest
-        print(f'{time.ctime()}: Manifest reloaded.')
+    def _report(self, event:dict):
+        ## push the completion to master, if asked in the handshake
+        if self.events and self.channel:
+            try:
+                self.channel.send(CONTROL_RID, event)
+            except OSError:
+                pass
         pass
 
     def auto_detect(self) -> socket.socket:
@@ -452,29 +1639,108 @@ class SlaveDaemon(Handler):
         iface_name = re.findall('default via (\\S+) dev (\\S+) .*', o)[0][1]
         o = SHELL_RUN('ip addr').stdout.decode()
         iface_network = re.findall(f'.+inet (\\S+).+{iface_name}', o)[0]
-        all_hosts = ipaddress.IPv4Network(iface_network, strict=False).hosts()
-        ## auto detect brutally
+        network = ipaddress.IPv4Network(iface_network, strict=False)
         print(f'Auto-detect master over {iface_name} ...')
-        for _,host in enumerate(all_hosts):
-            addr = str(host)
+        ## (1) ask the beacon of master via broadcast
+        master = self.discover( str(network.broadcast_address) )
+        if master:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.1)
-            if sock.connect_ex((addr, self.port)) == 0:
-                print(f'Find master on {addr}')
-                sock.settimeout(None)
+            if sock.connect_ex(master) == 0:
+                print(f'Find master on {master[0]} (beacon)')
                 return sock
+        ## (2) else scan the subnet with concurrent connects
+        sock = self.scan( network.hosts() )
+        if sock:
+            print(f'Find master on {sock.getpeername()[0]}')
+            return sock
         raise AutoDetectFailureException('No master found.')
 
+    def discover(self, broadcast:str, timeout:float=BEACON_TIMEOUT):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.settimeout(timeout / 3)
+        try:
+            for _ in range(3):
+                sock.sendto(b'tap-discover', (broadcast, BEACON_PORT))
+                try:
+                    msg, addr = sock.recvfrom(BUFFER_SIZE)
+                except socket.timeout:
+                    continue
+                ## ignore the malformed replies, from whatever answers on the beacon port
+                try:
+                    port = _decode(msg)['port']
+                except Exception:
+                    continue
+                if isinstance(port, int) and 0 < port < 65536:
+                    return ( addr[0], port )
+        except OSError:
+            pass
+        finally:
+            sock.close()
+        return None
+
+    def scan(self, hosts, timeout:float=SCAN_TIMEOUT):
+        selector = selectors.DefaultSelector()
+        hosts, found = iter(hosts), None
+        try:
+            while found is None:
+                ## keep at most `SCAN_WORKERS` connects in flight
+                while len(selector.get_map()) < SCAN_WORKERS:
+                    host = next(hosts, None)
+                    if host is None: break
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    sock.connect_ex((str(host), self.port))
+                    selector.register(sock, selectors.EVENT_WRITE, time.monotonic()+timeout)
+                if not selector.get_map(): break
+                ##
+                _deadline = min( x.data for x in selector.get_map().values() )
+                for key,_ in selector.select( max(0, _deadline - time.monotonic()) ):
+                    selector.unregister(key.fileobj)
+                    if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)==0 and found is None:
+                        found = key.fileobj
+                    else:
+                        key.fileobj.close()
+                _now = time.monotonic()
+                for key in [ x for x in selector.get_map().values() if x.data <= _now ]:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+        if found: found.setblocking(True)
+        return found
+
+    def serve_stream(self, stream:Stream):
+        try:
+            msg = _decode( stream.recv() )
+        except Exception as e:
+            stream.send({ 'err': UntangledException.format('Client', e) })
+            stream.close()
+            return
+        if _blocking(msg): #park the blocking waits outside the worker pool
+            threading.Thread(target=self.respond, args=(stream, msg), daemon=True).start()
+        else:
+            self.respond(stream, msg)
+        pass
+
+    def respond(self, stream:Stream, msg:dict):
+        try:
+            res = self.handle(msg['request'], msg['args'], stream=stream)
+        except Exception as e:
+            err = { 'err': UntangledException.format('Client', e) }
+            stream.send(err)
+        else:
+            stream.send(res)
+        finally:
+            stream.close()
+        pass
+
     def daemon(self, sock):
-        while True:
-            try:
-                msg = json.loads( _recv(sock).decode() )
-                res = self.handle(msg['request'], msg['args'])
-            except Exception as e:
-                err = { 'err': UntangledException.format('Client', e) }
-                _send(sock, err)
-            else:
-                _send(sock, res)
+        with ThreadPoolExecutor(max_workers=SLAVE_WORKERS) as pool:
+            self.channel = Channel(sock, 'master', on_open=lambda x: pool.submit(self.serve_stream, x))
+            self.channel.service()
         pass
 
     def start(self):
@@ -483,67 +1749,136 @@ class SlaveDaemon(Handler):
             self.sock.connect((self.addr, self.port))
         else:
             self.sock = self.auto_detect()
-        ## initial register
-        _send(self.sock, {'name':self.name})
+        ## initial register, asking whether to report the completed tasks
+        _send(self.sock, {'name':self.name, 'events':True})
+        self.events = _decode( _recv(self.sock) )['events']
         print( f'Client "{self.name}" is now on.' )
         ##
+        self.supervisor.start()
+        self.executor.start()
+        if self.watch > 0:
+            threading.Thread(target=self.watch_service, args=(self.watch,), daemon=True).start()
         self.daemon(self.sock)
         pass
 
     pass
 
 class MasterDaemon(Handler):
-    def __init__(self, port:int, ipc_port:int, manifest={}):
+    def __init__(self, port:int, ipc_port:int, manifest={}, beacon=False,
+                 heartbeat:tuple=(HEARTBEAT_INTERVAL, HEARTBEAT_MISS),
+                 retention:tuple=(TASK_MAX_ENTRIES, TASK_MAX_BYTES, TASK_TTL), max_tasks:int=EXEC_WORKERS,
+                 watch:float=WATCH_INTERVAL, store:str=''):
         self.name = ''
-        self.manifest = manifest
+        self._load(manifest)
         ##
         self.port, self.ipc_port = port, ipc_port
+        self.beacon = beacon
+        self.heartbeat = heartbeat
+        self.watch = watch
+        self.store = ResultStore(store) if store else None
         self.client_pool = dict()
-        self.task_pool = dict()
+        self.task_pool = TaskPool(*retention)
+        self.supervisor = ProcessSupervisor()
+        self.task_cond = threading.Condition()
+        self.executor = TaskExecutor(self, max_tasks)
         pass
 
-    def _reload(self):
-        manifest = open('./manifest.json')
-        manifest = json.load( manifest )
-        self.manifest = manifest
-        print(f'{time.ctime()}: Manifest reloaded.')
+    def _report(self, event:dict):
+        if self.store: self.store.record('', event)
+        pass
+
+    def estimate_clock(self, name:str, samples:int=CLOCK_SAMPLES) -> dict:
+        ## NTP-style exchange, keeping the sample of minimal round trip
+        try:
+            client = self.client_pool[name]
+        except:
+            raise ClientNotFoundException(f'Client "{name}" not exists.')
+        offset, rtt = 0.0, float('inf')
+        for _ in range(samples):
+            t0 = time.time()
+            res = self.proxy(name, client, 'clock', {})
+            t3 = time.time()
+            if 'err' in res: UntangledException(res['err'])
+            if t3 - t0 < rtt:
+                offset, rtt = res['time'] - (t0+t3)/2, t3 - t0
+        client['clock'], client['clock_at'] = { 'offset':offset, 'rtt':rtt }, time.monotonic()
+        return client['clock']
+
+    def proxy_service(self, name, channel:Channel):
+        channel.service()
+        ## evict the client, while the pending streams are failed on channel close
+        if name in self.client_pool and self.client_pool[name]['channel'] is channel:
+            self.client_pool.pop(name)
+        print(f'Client "{name}" disconnected.')
+        pass
+
+    def dispatch(self, reply, rid:int, msg:bytes):
+        try:
+            msg = _decode(msg)
+        except Exception as e:
+            reply(rid, _encode({ 'err': UntangledException.format('Server', e) }))
+            return
+        if _blocking(msg): #park the blocking waits outside the worker pool
+            threading.Thread(target=self.respond, args=(reply, rid, msg), daemon=True).start()
+        else:
+            self.respond(reply, rid, msg)
+        pass
+
+    def respond(self, reply, rid:int, msg:dict):
+        try:
+            res = self.handle(msg['request'], msg['args'], client=msg['client'])
+            res = _encode(res)
+        except Exception as e:
+            err = { 'err': UntangledException.format('Server', e) }
+            err = _encode(err)
+            reply(rid, err)
+        else:
+            reply(rid, res)
+        pass
+
+    def ipc_session(self, conn:socket.socket):
+        lock = threading.Lock()
+        def _reply(rid, res):
+            with lock: _send(conn, res, rid)
+        ##
+        try:
+            while True:
+                rid, msg = _recv_tagged(conn)
+                self.ipc_pool.submit(self.dispatch, _reply, rid, msg)
+        except (struct.error, OSError):
+            pass
+        finally:
+            conn.close()
         pass
 
-    def proxy_service(self, name, tx:Queue, rx:Queue):
+    def ipc_listen(self, sock:socket.socket):
+        sock.listen()
         while True:
-            try:
-                res = self.proxy( name, self.client_pool[name], *rx.get() )
-            except struct.error:
-                e = ClientConnectionLossException(f'{name} disconnected.')
-                tx.put({ 'err': UntangledException.format('Proxy', e) })
-                self.client_pool.pop(name)
-                break
-            except Exception as e:
-                err = { 'err': UntangledException.format('Proxy', e) }
-                tx.put( err )
-            else:
-                tx.put( res )
+            conn, _ = sock.accept()
+            threading.Thread(target=self.ipc_session, args=(conn,), daemon=True).start()
         pass
 
     def daemon(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.bind(('', self.ipc_port))
+        ## persistent stream connections, over TCP and unix domain socket
+        tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        tcp_sock.bind(('', self.ipc_port))
+        unix_path = IPC_UNIX_PATH.format(port=self.ipc_port)
+        if os.path.exists(unix_path): os.unlink(unix_path)
+        unix_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        unix_sock.bind(unix_path)
         ##
         print('IPC Daemon is now on.')
-        while True:
-            msg, addr = sock.recvfrom(BUFFER_SIZE)
-            cmd, args = msg.decode().split(maxsplit=1)
-            ##
-            try:
-                res = self.handle(cmd, args)
-                res = json.dumps(res).encode()
-            except Exception as e:
-                err = { 'err': UntangledException.format('Server', e) }
-                err = json.dumps(err).encode()
-                _frag_send(sock, err, target=addr)
-            else:
-                _frag_send(sock, res, target=addr)
-            pass
+        with ThreadPoolExecutor(max_workers=IPC_WORKERS) as self.ipc_pool:
+            for _sock in [tcp_sock, unix_sock]:
+                threading.Thread(target=self.ipc_listen, args=(_sock,), daemon=True).start()
+            while True:
+                msg, addr = sock.recvfrom(BUFFER_SIZE)
+                _reply = lambda rid, res, addr=addr: _frag_send(sock, res, addr, rid)
+                rid = struct.unpack('I', msg[:4])[0]
+                self.ipc_pool.submit(self.dispatch, _reply, rid, msg[4:])
         pass
 
     def serve(self):
@@ -555,37 +1890,84 @@ class MasterDaemon(Handler):
         while True:
             conn, addr = sock.accept()
             try:
-                name = json.loads( _recv(conn).decode() )['name']
+                msg = _decode( _recv(conn) )
+                name = msg['name']
+                ## the completed tasks are reported only to a result store
+                if 'events' in msg:
+                    _send(conn, {'events':self.store is not None})
                 print(f'Client "{name}" connected.')
             except:
                 print(f'malicious connection detected: {addr}.')
             else:
-                tx, rx = Queue(), Queue()
-                handler = threading.Thread(target=self.proxy_service, args=(name, rx, tx))
+                on_event = (lambda x, name=name: self.store.record(name, x)) if self.store else None
+                channel = Channel(conn, name, on_event=on_event)
+                handler = threading.Thread(target=self.proxy_service, args=(name, channel))
                 self.client_pool.update({
-                    name:{'handler':handler,'conn':conn,'task_pool':{},'addr':addr,'tx':tx,'rx':rx} })
+                    name:{'handler':handler,'conn':conn,'task_pool':{},'addr':addr,'channel':channel} })
                 handler.start()
+                self.proxy_pool.submit(self.estimate_clock, name)
+        pass
+
+    def heartbeat_service(self):
+        interval, miss = self.heartbeat
+        while True:
+            time.sleep(interval)
+            _now = time.monotonic()
+            for name,client in list(self.client_pool.items()):
+                channel = client['channel']
+                if _now - channel.alive > interval * miss:
+                    print(f'Client "{name}" missed {miss} heartbeats.')
+                    channel.close() #evicted by `proxy_service`
+                else:
+                    try:
+                        channel.ping()
+                    except OSError:
+                        channel.close()
+                ## re-estimate the clock offset as it drifts
+                if _now - client.get('clock_at', _now) > CLOCK_MAX_AGE:
+                    client['clock_at'] = _now #once in flight
+                    self.proxy_pool.submit(self.estimate_clock, name)
+        pass
+
+    def beacon_service(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('', BEACON_PORT))
+        print('Beacon is now on.')
+        while True:
+            msg, addr = sock.recvfrom(BUFFER_SIZE)
+            if msg==b'tap-discover':
+                sock.sendto(_encode({'port':self.port}), addr)
         pass
 
     def start(self):
+        self.supervisor.start()
+        self.executor.start()
+        self.proxy_pool = ThreadPoolExecutor(max_workers=PROXY_WORKERS)
         self.server_thread = threading.Thread(target=self.serve)
         self.server_thread.start()
+        if self.beacon:
+            threading.Thread(target=self.beacon_service, daemon=True).start()
+        if self.heartbeat[0] > 0:
+            threading.Thread(target=self.heartbeat_service, daemon=True).start()
+        if self.watch > 0:
+            threading.Thread(target=self.watch_service, args=(self.watch,), daemon=True).start()
         self.daemon()
         pass
 
     pass
 
 class Connector(Handler):
-    """The IPC broker used to communicate with the tap server, via UDP.
+    """The IPC broker used to communicate with the tap server, via UDP, TCP or unix domain socket.
 
     Args:
         client (str): The client name. Leave empty to only query from server.
-        addr (str): (Optional) Specify the IP address of the server, default as ''.
+        addr (str): (Optional) Specify the IP address of the server (or the socket path for 'unix'), default as ''.
         port (int): (Optional) Specify the port of the server, default as 52525.
+        transport (str): (Optional) One of 'udp', 'tcp' or 'unix', default as 'udp'. A request over UDP is limited to one datagram.
     """
 
     class BatchExecutor:
-        __slots__ = ['parent', 'pipeline', 'task_list', 'tid_list', 'outputs']
+        __slots__ = ['parent', 'pipeline', 'task_list', 'tid_list', 'results', 'outputs']
         def __init__(self, parent):
             self.parent = parent
             self._initialize()
@@ -593,24 +1975,97 @@ class Connector(Handler):
 
         def _initialize(self):
             self.pipeline, self.task_list = list(), list()
-            self.tid_list, self.outputs = list(), list()
+            self.tid_list, self.results, self.outputs = list(), dict(), list()
             pass
 
-        def _apply_tasks(self):
-            res = self.parent.handle('batch_execute', self.task_list)
+        def _launch(self, task_list:list) -> list:
+            res = self.parent.handle('batch_execute', [ (name,args) for (name,args,_) in task_list ])
             [ UntangledException(e) for e in res['err_list'] if e ]
-            ##
-            res = res['tid_list']
-            res = [ (name,tid) for (name,_),tid in zip(self.task_list, res) ]
+            return res['tid_list']
+
+        def _apply_tasks(self):
+            if any( step for (_,_,step) in self.task_list ):
+                res, results = self._apply_steps()
+                self.results.update( (len(self.tid_list)+i, x) for i,x in results.items() )
+            else:
+                res = self._launch(self.task_list)
+            res = [ (name,tid) for (name,_,_),tid in zip(self.task_list, res) ]
             self.tid_list.extend( res )
             self.task_list = list() #cleanup
             pass
 
-        def _apply_fetch(self):
-            res = [ self.parent.handle('fetch', {'tid':tid}, client=name) if tid else None
-                        for (name,tid) in self.tid_list ]
-            self.outputs.extend( res )
-            self.tid_list = list() #cleanup
+        def _apply_steps(self) -> tuple:
+            ## launch each task once its dependencies are met, blocking on the completion of the watched tasks;
+            ## the results are collected as the watched tasks complete, and a failed task fails its followers
+            tasks = self.task_list
+            tags = { step['tag']:i for i,(_,_,step) in enumerate(tasks) if step.get('tag') }
+            for (_,_,step) in tasks:
+                for tag in [ *step.get('after',[]), *step.get('ready',{}) ]:
+                    if tag not in tags:
+                        raise InvalidRequestException(f'Step "{tag}" is not batched ahead.')
+            tids, results, done, exited = [None]*len(tasks), dict(), set(), set()
+            texts, offsets, matched = dict(), dict(), set()
+            ##
+            _after = lambda i: [ tags[t] for t in tasks[i][2].get('after',[]) ]
+            _ready = lambda i: [ (tags[t],regex) for t,regex in tasks[i][2].get('ready',{}).items() ]
+            _failed = lambda j: j in results and 'err' in results[j]
+            pending = list(range(len(tasks)))
+            while pending:
+                ## launch the tasks with all the dependencies met, and drop those never to be met
+                launch, failed = list(), list()
+                for i in pending:
+                    deps = _after(i) + [ j for j,_ in _ready(i) ]
+                    if any( j not in pending and tids[j] is None for j in deps ):
+                        failed.append(i)
+                    elif any( _failed(j) for j in _after(i) ):
+                        failed.append(i)
+                    elif any( (j,regex) not in matched and j in exited for j,regex in _ready(i) ):
+                        failed.append(i)
+                    elif all( j in done for j in _after(i) ) and all( x in matched for x in _ready(i) ):
+                        launch.append(i)
+                if launch:
+                    for i,tid in zip(launch, self._launch([ tasks[i] for i in launch ])):
+                        tids[i] = tid
+                pending = [ i for i in pending if i not in launch and i not in failed ]
+                if not pending or launch or failed: continue
+                ##
+                watched = { j for i in pending for j in _after(i) if tids[j] and j not in done }
+                watching = { j for i in pending for j,regex in _ready(i) if tids[j] and (j,regex) not in matched }
+                if not watched and not watching: break #cyclic dependencies
+                ## block on the completion of any watched task, or for a poll interval when the outputs are watched
+                if watched:
+                    args = { 'tid_list':[ (tasks[j][0], tids[j]) for j in watched ], 'mode':'any',
+                             'timeout':POLL_INTERVAL if watching else -1 }
+                    _done = { tuple(x) for x in self.parent.handle('batch_wait', args)['done'] }
+                    finished = [ j for j in watched if (tasks[j][0], tids[j]) in _done ]
+                    if finished: #collect the results as they complete
+                        args = { 'tid_list':[ (tasks[j][0], tids[j]) for j in finished ], 'block':False, 'timeout':0 }
+                        results.update( zip(finished, self.parent.handle('batch_fetch', args)['results']) )
+                        done.update( finished )
+                ## poll the outputs of the watched tasks, matching the readiness patterns
+                for j in watching:
+                    args = { 'tid':tids[j], 'since':offsets.get(j,0), 'index':0, 'stream':'stdout' }
+                    res = self.parent.handle('tail', args, client=tasks[j][0])
+                    texts[j], offsets[j] = texts.get(j,'') + res['data'], res['offset']
+                    matched.update( (j,regex) for i in pending for k,regex in _ready(i)
+                                        if k==j and re.search(regex, texts[j]) )
+                    if res['done'] and not res['data']: exited.add(j)
+                if not watched: time.sleep(POLL_INTERVAL)
+            ## the tasks never launched
+            for i in [ i for i,tid in enumerate(tids) if tid is None ]:
+                e = DependencyFailureException(f'"{tasks[i][1]["function"]}" skipped, as its dependencies failed or never met.')
+                results[i] = { 'err': (type(e).__name__, f'\b:[[Batch]]: {e}') }
+            return tids, results
+
+        def _apply_fetch(self, block:bool, timeout:float):
+            ## fetch the results not collected yet by the steps
+            index = [ i for i in range(len(self.tid_list)) if i not in self.results ]
+            if index:
+                args = {'tid_list':[ self.tid_list[i] for i in index ], 'block':block, 'timeout':timeout}
+                res = self.parent.handle('batch_fetch', args)
+                self.results.update( zip(index, res['results']) )
+            self.outputs.extend( self.results[i] for i in range(len(self.tid_list)) )
+            self.tid_list, self.results = list(), dict() #cleanup
 
         def _apply_outputs(self):
             if self.task_list: self._apply_tasks()
@@ -618,7 +2073,8 @@ class Connector(Handler):
             self._initialize() #cleanup
             return outputs
 
-        def batch(self, client:str, function:str, parameters:dict={}, timeout:float=-1):
+        def batch(self, client:str, function:str, parameters:dict={}, timeout:float=-1,
+                  tag:str='', after:list=[], ready:dict={}, start_at:float=None):
             """Batch execution by simultaneously sending commands, then use `.apply` to apply send action.
 
             Args:
@@ -626,13 +2082,18 @@ class Connector(Handler):
                 function (str): The function names.
                 parameters (dict): The parameters provided for the function. The absent values will use the default values in the manifest.
                 timeout (float): The longest time in seconds waiting for the outputs from function execution.
+                tag (str): (Optional) The step name referred by the `after` and `ready` of the following executions.
+                after (list): (Optional) Start only after the tagged executions complete, or skip with `{'err': ...}` if any fails.
+                ready (dict): (Optional) Start only after each tagged execution prints the regex on stdout of its first command.
+                start_at (float): (Optional) The UNIX time on server clock to spawn the commands at.
 
             Returns:
                 Self: used for chain call.
             """
             args = {'function':function, 'parameters':parameters, 'timeout':timeout}
-            args = {'request':'execute', 'args':args}
-            cmd = ( client, json.dumps(args) )
+            if start_at: args['start_at'] = start_at
+            step = {'tag':tag, 'after':[after] if isinstance(after,str) else after, 'ready':ready}
+            cmd = ( client, args, {k:v for k,v in step.items() if v} )
             self.pipeline.append(cmd)
             return self
 
@@ -664,16 +2125,17 @@ class Connector(Handler):
             self.pipeline.append(duration)
             return self
 
-        def fetch(self):
+        def fetch(self, block:bool=False, timeout:float=-1):
             """Fetch the batch execution results.
 
             Args:
-                None.
+                block (bool): (Optional) Wait until each task completes, instead of a fixed `wait` ahead.
+                timeout (float): (Optional) The longest time in seconds for blocking wait of each task.
 
             Returns:
-                list: The results in list in the order of batching enqueue sequence.
+                list: The results in list in the order of batching enqueue sequence, with `{'err': ...}` in place of a failed task.
             """
-            self.pipeline.append('fetch')
+            self.pipeline.append({'block':block, 'timeout':timeout})
             return self
 
         def apply(self):
@@ -685,39 +2147,81 @@ class Connector(Handler):
             Returns:
                 outputs (list): The outputs following the enqueue order of the batched tasks.
             """
-            while self.pipeline:
-                item = self.pipeline[0] #view
-                if isinstance(item, tuple):                     ## * --> tasks
-                    self.task_list.append(item)
-                else:
-                    if self.task_list: self._apply_tasks()      ## task --> tid
-                    if isinstance(item, str) and item=='fetch': ## tid --> outputs
-                        self._apply_fetch()
-                    elif isinstance(item, float) or isinstance(item, int): ## (await)
-                        time.sleep(item)
-                self.pipeline.pop(0) #pop
-            ##
-            outputs = self._apply_outputs()
+            try:
+                while self.pipeline:
+                    item = self.pipeline[0] #view
+                    if isinstance(item, tuple):                     ## * --> tasks
+                        self.task_list.append(item)
+                    else:
+                        if self.task_list: self._apply_tasks()      ## task --> tid
+                        if isinstance(item, dict):                  ## tid --> outputs
+                            self._apply_fetch(**item)
+                        elif isinstance(item, float) or isinstance(item, int): ## (await)
+                            time.sleep(item)
+                    self.pipeline.pop(0) #pop
+                ##
+                outputs = self._apply_outputs()
+            except:
+                self._initialize() #cleanup
+                raise
             return outputs
 
         pass
 
-    def __init__(self, client:str='', addr:str='127.0.0.1', port:int=0):
+    def __init__(self, client:str='', addr:str='127.0.0.1', port:int=0, transport:str='udp'):
         self.client = client
         self.executor = Connector.BatchExecutor(self)
         addr = addr if addr else ''
         port = port if port else IPC_PORT
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.connect((addr, port))
+        if transport=='udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect((addr, port))
+        elif transport=='tcp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.connect((addr, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        elif transport=='unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(addr if addr.startswith('/') else IPC_UNIX_PATH.format(port=port))
+        else:
+            raise InvalidRequestException(f'Transport "{transport}" is invalid.')
+        self.transport = transport
+        self.rid = itertools.count(1)
+        self.cache = dict()
         pass
 
+    def _request(self, req:bytes) -> bytes:
+        rid = next(self.rid)
+        if self.transport=='udp':
+            ## the server reads one datagram of `BUFFER_SIZE`, with the request id ahead
+            if len(req) > BUFFER_SIZE - 4:
+                raise InvalidRequestException(f'Request of {len(req)} bytes exceeds {BUFFER_SIZE-4} bytes over UDP, use transport "tcp".')
+            self.sock.sendmsg([struct.pack('I', rid), req])
+            return _frag_recv(self.sock, rid)
+        ##
+        _send(self.sock, req, rid)
+        while True:
+            _rid, res = _recv_tagged(self.sock)
+            if _rid==rid: return res
+
     def list_all(self) -> dict:
         """List all online clients."""
         return self.handle('list_all', {})
 
+    def _cached(self, request:str, args:dict) -> dict:
+        ## revalidate the cached response with its manifest version, instead of a full transfer
+        key = (self.client, request, json.dumps(args, sort_keys=True))
+        if key in self.cache:
+            args = dict(args, version=self.cache[key]['__version__'])
+        res = self.handle(request, args)
+        if res.get('__unchanged__'):
+            return self.cache[key]
+        self.cache[key] = res
+        return res
+
     def describe(self) -> dict:
-        """Return the available functions on the connected client."""
-        return self.handle('describe', {})
+        """Return the available functions on the connected client, with the manifest hash as `__version__`."""
+        return dict( self._cached('describe', {}) )
 
     def reload(self) -> dict:
         """Request remote manifest to reload.
@@ -736,44 +2240,163 @@ class Connector(Handler):
         Returns:
             dict: The dictionary object contains full manifest of the function.
         """
-        return self.handle('info', {'function':function})
+        res = dict( self._cached('info', {'function':function}) )
+        res.pop('__version__', None)
+        return res
+
+    def push_manifest(self, manifest:dict={}, clients:list=None) -> dict:
+        """Replace the manifest on the clients in parallel, each keeping its own client name.
+
+        Args:
+            manifest (dict): (Optional) The new manifest, default as the manifest on server.
+            clients (list): (Optional) The client names, default as all online clients.
+
+        Returns:
+            dict: The new manifest version (or the error) of each client.
+        """
+        return self.handle('push_manifest', {'manifest':manifest, 'clients':clients})
 
-    def sync_code(self, basename:str):
-        """Push the codebase on server to the client.
+    def sync_code(self, basename:str, blocks:bool=True, compress:str=''):
+        """Push the codebase on server to the client, skipping the files the client already has.
 
         Args:
             basename (str): The codebase name.
+            blocks (bool): (Optional) Send only the changed blocks of the modified files, default as True.
+            compress (str): (Optional) One of 'none', 'auto', 'zlib' or 'lzma', default as the codebase entry in manifest.
 
         Returns:
-            dict: The response information.
+            dict: The response information, with the transfer summary (files sent/skipped/compressed,
+                bytes sent/saved/on wire, compression ratio and throughput in MB/s).
+        """
+        return self.handle('sync_code', {'basename':basename, 'blocks':blocks, 'compress':compress})
+
+    def sync_code_all(self, basename:str, clients:list=None, blocks:bool=True, compress:str='') -> dict:
+        """Push the codebase on server to many clients concurrently, with each file read once on server.
+
+        Args:
+            basename (str): The codebase name.
+            clients (list): (Optional) The client names, default as all the online clients.
+            blocks (bool): (Optional) Send only the changed blocks of the modified files, default as True.
+            compress (str): (Optional) One of 'none', 'auto', 'zlib' or 'lzma', default as the codebase entry in manifest.
+
+        Returns:
+            dict: The response of `Connector.sync_code` per client, with 'err' in place for the failed ones.
         """
-        return self.handle('sync_code', {'basename':basename})
+        args = {'basename':basename, 'blocks':blocks, 'compress':compress, 'clients':clients}
+        return self.handle('sync_code_all', args, client='')
 
-    def execute(self, function:str, parameters:dict={}, timeout:float=-1) -> str:
+    def execute(self, function:str, parameters:dict={}, timeout:float=-1, priority:int=0, start_at:float=None) -> str:
         """Execute the function asynchronously, return instantly with task id.
 
         Args:
             function (str): The function name.
             parameters (dict): The parameters provided for the function. The absent values will use the default values in the manifest.
             timeout (float): The longest time in seconds waiting for the outputs from function execution.
+            priority (int): (Optional) The tasks with higher priority leave the queue first, default as 0.
+            start_at (float): (Optional) The UNIX time on server clock to spawn the commands at, reporting the achieved error in seconds as `__start_error__` of the results.
 
         Returns:
             str: The task ID.
         """
-        args = { 'function':function, 'parameters':parameters, 'timeout':timeout }
+        args = { 'function':function, 'parameters':parameters, 'timeout':timeout, 'priority':priority }
+        if start_at: args['start_at'] = start_at
         res = self.handle('execute', args)
         return res['tid']
 
-    def fetch(self, tid:str) -> dict:
+    def fetch(self, tid:str, block:bool=False, timeout:float=-1) -> dict:
         """Fetch the previous function execution results with task id.
 
         Args:
             tid (str): Task ID obtained from `Connector.execute`.
+            block (bool): (Optional) Wait until the task completes, instead of raising `NoResponseException` instantly.
+            timeout (float): (Optional) The longest time in seconds for blocking wait, default as no limit.
 
         Returns:
             dict: the output collected in dictionary struct.
         """
-        return self.handle('fetch', {'tid':tid})
+        return self.handle('fetch', {'tid':tid, 'block':block, 'timeout':timeout})
+
+    def status(self, tid:str) -> dict:
+        """Return the state of the task, either 'queued', 'running' or 'done'.
+
+        Args:
+            tid (str): Task ID obtained from `Connector.execute`.
+
+        Returns:
+            dict: The 'state' of the task, and its 'position' in the queue (-1 if not queued).
+        """
+        return self.handle('status', {'tid':tid})
+
+    def sync_clock(self, clients:list=None) -> dict:
+        """Estimate the clock offset and round trip time of the clients to server.
+
+        Args:
+            clients (list): (Optional) The client names, default as all online clients.
+
+        Returns:
+            dict: The 'offset' and 'rtt' in seconds (or the error) of each client.
+        """
+        return self.handle('sync_clock', {'clients':clients})
+
+    def query(self, client:str=None, function:str=None, since:float=None, until:float=None,
+              outputs:list=None, limit:int=-1) -> list:
+        """Query the completed tasks recorded on server, see `--result-store`.
+
+        Args:
+            client (str): (Optional) The client name ('' for server), default as all.
+            function (str): (Optional) The function name, default as all.
+            since (float): (Optional) The UNIX time the tasks started from, default as no limit.
+            until (float): (Optional) The UNIX time the tasks started before, default as no limit.
+            outputs (list): (Optional) Keep only these outputs, and only the tasks with any of them.
+            limit (int): (Optional) The maximum number of tasks, default as no limit.
+
+        Returns:
+            list: The tasks in the order of start time, each with 'tid', 'client', 'function', 'parameters', 'started', 'ended' and 'outputs'.
+        """
+        args = { 'client':client, 'function':function, 'since':since, 'until':until, 'outputs':outputs, 'limit':limit }
+        return self.handle('query', args, client='')['results']
+
+    def wait_any(self, tid_list:list, timeout:float=-1) -> list:
+        """Block until any of the tasks completes.
+
+        Args:
+            tid_list (list): Task IDs obtained from `Connector.execute`.
+            timeout (float): (Optional) The longest time in seconds for waiting, default as no limit.
+
+        Returns:
+            list: The task IDs already completed, empty if timeout.
+        """
+        args = { 'tid_list':tid_list, 'mode':'any', 'timeout':timeout }
+        return self.handle('wait', args)['done']
+
+    def wait_all(self, tid_list:list, timeout:float=-1) -> list:
+        """Block until all of the tasks complete.
+
+        Args:
+            tid_list (list): Task IDs obtained from `Connector.execute`.
+            timeout (float): (Optional) The longest time in seconds for waiting, default as no limit.
+
+        Returns:
+            list: The task IDs already completed.
+        """
+        args = { 'tid_list':tid_list, 'mode':'all', 'timeout':timeout }
+        return self.handle('wait', args)['done']
+
+    def tail(self, tid:str, since:int=0, index:int=0, stream:str='stdout') -> dict:
+        """Fetch the new outputs of a (running) task incrementally.
+
+        Args:
+            tid (str): Task ID obtained from `Connector.execute`.
+            since (int): The byte offset returned by the previous call, default as 0.
+            index (int): The index of the command in the function, default as 0.
+            stream (str): Either 'stdout' or 'stderr', default as 'stdout'.
+
+        Returns:
+            dict: The new outputs in 'data', the next offset in 'offset', and whether the task is 'done'.
+                  The data ends at a character boundary, and 'offset' is the byte offset right after it.
+        """
+        args = { 'tid':tid, 'since':since, 'index':index, 'stream':stream }
+        return self.handle('tail', args)
 
     def batch(self, *args, **kwargs):
         """Batch execution by simultaneously sending commands, then use `.apply` to apply send action.
@@ -783,6 +2406,10 @@ class Connector(Handler):
             function (str): The function names.
             parameters (dict): The parameters provided for the function. The absent values will use the default values in the manifest.
             timeout (float): The longest time in seconds waiting for the outputs from function execution.
+            tag (str): (Optional) The step name referred by the `after` and `ready` of the following executions.
+            after (list): (Optional) Start only after the tagged executions complete, or skip with `{'err': ...}` if any fails.
+            ready (dict): (Optional) Start only after each tagged execution prints the regex on stdout of its first command.
+            start_at (float): (Optional) The UNIX time on server clock to spawn the commands at.
 
         Returns:
             Self: used for chain call.
@@ -813,6 +2440,171 @@ class Connector(Handler):
 
     pass
 
+class AsyncConnector:
+    """The asyncio counterpart of `Connector`, keeping many requests in flight over one TCP or unix domain socket.
+
+    The replies are matched to the awaiting requests by their request id, so a single event loop
+    could `asyncio.gather` the requests across the cluster. A lost connection fails the requests in flight
+    with `ConnectionResetError`, and the next request reconnects.
+
+    Args:
+        client (str): The default client name of the requests. Leave empty to only query from server.
+        addr (str): (Optional) Specify the IP address of the server (or the socket path for 'unix'), default as '127.0.0.1'.
+        port (int): (Optional) Specify the port of the server, default as 52525.
+        transport (str): (Optional) Either 'tcp' or 'unix', default as 'tcp'.
+    """
+    def __init__(self, client:str='', addr:str='127.0.0.1', port:int=0, transport:str='tcp'):
+        if transport not in ['tcp', 'unix']:
+            raise InvalidRequestException(f'Transport "{transport}" is invalid.')
+        self.client = client
+        self.addr, self.port = addr if addr else '', port if port else IPC_PORT
+        self.transport = transport
+        self.rid = itertools.count(1)
+        self.pending = dict()
+        self.reader, self.writer, self.service = None, None, None
+        self.lock = None #created in the event loop
+        pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *_exc):
+        await self.close()
+        pass
+
+    async def connect(self):
+        if self.lock is None: self.lock = asyncio.Lock()
+        async with self.lock: #connect once for the concurrent requests
+            if self.writer is not None: return
+            if self.transport=='tcp':
+                reader, writer = await asyncio.open_connection(self.addr, self.port)
+                writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            else:
+                path = self.addr if self.addr.startswith('/') else IPC_UNIX_PATH.format(port=self.port)
+                reader, writer = await asyncio.open_unix_connection(path)
+            self.reader, self.writer = reader, writer
+            self.service = asyncio.ensure_future( self._service(reader, writer) )
+        pass
+
+    async def close(self):
+        if self.writer:
+            service = self.service
+            self.writer.close()
+            await service
+        pass
+
+    async def _service(self, reader, writer):
+        ## demultiplex the replies to the awaiting requests
+        err = ConnectionResetError('connection closed.')
+        try:
+            while True:
+                _len, rid = FRAME_HEADER.unpack( await reader.readexactly(FRAME_HEADER.size) )
+                msg = await reader.readexactly(_len - 4)
+                future = self.pending.pop(rid, None)
+                if future and not future.done(): future.set_result(msg)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            err = ConnectionResetError(str(e))
+        finally:
+            ## mark the connection closed, failing the pending requests; the next request reconnects
+            writer.close()
+            if self.writer is writer:
+                self.reader, self.writer, self.service = None, None, None
+            for future in self.pending.values():
+                if not future.done(): future.set_exception(err)
+            self.pending.clear()
+        pass
+
+    async def handle(self, request:str, args, client=None) -> dict:
+        if self.writer is None: await self.connect()
+        rid, future = next(self.rid), asyncio.get_running_loop().create_future()
+        client = self.client if client is None else client
+        req = _encode({ 'request':request, 'client':client, 'args':args })
+        if self.writer is None: #lost right after connect
+            raise ConnectionResetError('connection closed.')
+        self.pending[rid] = future
+        try:
+            self.writer.write( FRAME_HEADER.pack(len(req)+4, rid) + req )
+            await self.writer.drain()
+            res = _decode( await future )
+        finally:
+            self.pending.pop(rid, None) #also on cancellation
+        if 'err' in res:
+            UntangledException(res['err'])
+        return res
+
+    async def list_all(self) -> dict:
+        """List all online clients."""
+        return await self.handle('list_all', {})
+
+    async def describe(self, client:str=None) -> dict:
+        """Return the available functions on the client, with the manifest hash as `__version__`."""
+        return await self.handle('describe', {}, client)
+
+    async def info(self, function:str, client:str=None) -> dict:
+        """Return the details of the function on the client."""
+        res = await self.handle('info', {'function':function}, client)
+        res.pop('__version__', None)
+        return res
+
+    async def sync_code(self, basename:str, blocks:bool=True, compress:str='', client:str=None) -> dict:
+        """Push the codebase on server to the client, see `Connector.sync_code`."""
+        return await self.handle('sync_code', {'basename':basename, 'blocks':blocks, 'compress':compress}, client)
+
+    async def sync_code_all(self, basename:str, clients:list=None, blocks:bool=True, compress:str='') -> dict:
+        """Push the codebase on server to the clients in parallel, see `Connector.sync_code_all`."""
+        args = { 'basename':basename, 'clients':clients, 'blocks':blocks, 'compress':compress }
+        return await self.handle('sync_code_all', args, '')
+
+    async def execute(self, function:str, parameters:dict={}, timeout:float=-1, priority:int=0,
+                      start_at:float=None, client:str=None) -> str:
+        """Execute the function on the client, return the task ID, see `Connector.execute`."""
+        args = { 'function':function, 'parameters':parameters, 'timeout':timeout, 'priority':priority }
+        if start_at: args['start_at'] = start_at
+        res = await self.handle('execute', args, client)
+        return res['tid']
+
+    async def fetch(self, tid:str, block:bool=False, timeout:float=-1, client:str=None) -> dict:
+        """Fetch the execution results of the task on the client, see `Connector.fetch`."""
+        return await self.handle('fetch', {'tid':tid, 'block':block, 'timeout':timeout}, client)
+
+    async def status(self, tid:str, client:str=None) -> dict:
+        """Return the 'state' and the queue 'position' of the task on the client."""
+        return await self.handle('status', {'tid':tid}, client)
+
+    async def tail(self, tid:str, since:int=0, index:int=0, stream:str='stdout', client:str=None) -> dict:
+        """Return the new outputs of the running task on the client, see `Connector.tail`."""
+        args = { 'tid':tid, 'since':since, 'index':index, 'stream':stream }
+        return await self.handle('tail', args, client)
+
+    async def query(self, **kwargs) -> list:
+        """Query the completed tasks recorded on server, see `Connector.query`."""
+        return (await self.handle('query', kwargs, ''))['results']
+
+    async def batch_execute(self, task_list:list) -> list:
+        """Execute the functions on the clients in one request.
+
+        Args:
+            task_list (list): The executions as `(client, function, parameters, timeout)`, the last two are optional.
+
+        Returns:
+            list: The `(client, tid)` of each execution, with `tid` as None if failed to start.
+        """
+        tasks = [ (client, {'function':function, 'parameters':(params[0] if params else {}),
+                            'timeout':(params[1] if len(params)>1 else -1)})
+                    for (client, function, *params) in task_list ]
+        res = await self.handle('batch_execute', tasks, '')
+        [ UntangledException(e) for e in res['err_list'] if e ]
+        return [ (client,tid) for (client,_),tid in zip(tasks, res['tid_list']) ]
+
+    async def batch_fetch(self, tid_list:list, block:bool=False, timeout:float=-1) -> list:
+        """Fetch the results of the `(client, tid)` list in one request, with `{'err': ...}` in place of a failed task."""
+        args = { 'tid_list':tid_list, 'block':block, 'timeout':timeout }
+        res = await self.handle('batch_fetch', args, '')
+        return res['results']
+
+    pass
+
 def master_main(args):
     try:
         manifest = open('./manifest.json')
@@ -820,7 +2612,10 @@ def master_main(args):
         manifest = {}
     else:
         manifest = json.load( manifest )
-    master = MasterDaemon(args.port, args.ipc_port, manifest=manifest)
+    master = MasterDaemon(args.port, args.ipc_port, manifest=manifest, beacon=args.beacon,
+                          heartbeat=(args.heartbeat_interval, args.heartbeat_miss),
+                          retention=(args.task_max_entries, args.task_max_bytes, args.task_ttl),
+                          max_tasks=args.max_tasks, watch=args.watch_interval, store=args.result_store)
     master.start()
     pass
 
@@ -828,17 +2623,28 @@ def slave_main(args):
     manifest = open('./manifest.json')
     manifest = json.load( manifest )
     ##
-    slave = SlaveDaemon(args.port, manifest, args.client, alt_name=args.name)
+    slave = SlaveDaemon(args.port, manifest, args.client, alt_name=args.name,
+                        retention=(args.task_max_entries, args.task_max_bytes, args.task_ttl),
+                        max_tasks=args.max_tasks, watch=args.watch_interval)
     slave.start()
     pass
 
 def main():
     parser = argparse.ArgumentParser(description='All-in-one cluster control tap.')
     parser.add_argument('-p', '--port', type=int, nargs='?', default=SERVER_PORT, help='(Optional) server port.')
+    parser.add_argument('--task-max-entries', type=int, default=TASK_MAX_ENTRIES, help='(Optional) max tasks kept in memory.')
+    parser.add_argument('--task-max-bytes', type=int, default=TASK_MAX_BYTES, help='(Optional) max bytes of results kept in memory.')
+    parser.add_argument('--task-ttl', type=float, default=TASK_TTL, help='(Optional) seconds to keep the results after first fetch.')
+    parser.add_argument('--max-tasks', type=int, default=EXEC_WORKERS, help='(Optional) max tasks running at once, the others are queued.')
+    parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL, help='(Optional) seconds between the manifest change checks, 0 to disable.')
     ##
     s_group = parser.add_argument_group('Server specific')
     s_group.add_argument('-s', '--server', action='store_true', help='run in server mode.')
     s_group.add_argument('--ipc-port', type=int, nargs='?', default=IPC_PORT, help='(Optional) external IPC port.')
+    s_group.add_argument('--beacon', action='store_true', help='(Optional) answer the broadcast discovery of clients.')
+    s_group.add_argument('--heartbeat-interval', type=float, default=HEARTBEAT_INTERVAL, help='(Optional) heartbeat interval in seconds, 0 to disable.')
+    s_group.add_argument('--heartbeat-miss', type=int, default=HEARTBEAT_MISS, help='(Optional) missed heartbeats before evicting a client.')
+    s_group.add_argument('--result-store', type=str, default='', help='(Optional) SQLite file to record the completed tasks of all clients.')
     ##
     c_group = parser.add_argument_group('Client specific')
     c_group.add_argument('-c', '--client', type=str, default='', nargs='?', help='run in client mode.')